@@ -0,0 +1,175 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+# --------------- CONFIGURATION --------------- #
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 6 * 3600))
+# Cosine similarity above which two questions are treated as the same question
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.92))
+# How often (seconds) the index version is re-read to detect a re-ingest
+VERSION_CHECK_INTERVAL = 2.0
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop surrounding punctuation."""
+    return re.sub(r"\s+", " ", query.lower()).strip(" ?!.,;:")
+
+
+def unit_vector(vector) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class AnswerCache:
+    """
+    Two-tier answer cache in front of the LLM.
+
+    Exact tier: normalized question -> answer.
+    Semantic tier: nearest cached question by embedding cosine similarity,
+    accepted above `similarity_threshold`.
+
+    Entries expire after `ttl_seconds`, the least recently used entry is evicted
+    past `max_entries`, and everything is dropped when `version_fn` (the index
+    version written by ingestion) changes. An answer whose lookup began under
+    an older version is not stored.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Optional[Callable[[str], List[float]]] = None,
+        version_fn: Optional[Callable[[], str]] = None,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY,
+    ):
+        self.embed_fn = embed_fn
+        self.version_fn = version_fn
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[str, Optional[np.ndarray], float]]" = OrderedDict()
+        self._matrix = None  # stacked vectors of the semantic tier, rebuilt lazily
+        self._matrix_keys: List[str] = []
+        self._matrix_created = None  # insertion times of the matrix rows, to skip expired ones
+        self._version = version_fn() if version_fn else None
+        self._version_checked_at = time.monotonic()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    # ---------------- INVALIDATION ---------------- #
+    def invalidate(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self.invalidations += 1
+
+    def _check_version(self):
+        if not self.version_fn or time.monotonic() - self._version_checked_at < VERSION_CHECK_INTERVAL:
+            return
+        self._version_checked_at = time.monotonic()
+        version = self.version_fn()
+        if version != self._version:
+            self._version = version
+            self.invalidate()
+
+    def current_version(self) -> Optional[str]:
+        """Index version to pass to put() for an answer computed from now on."""
+        return self.version_fn() if self.version_fn else None
+
+    # ---------------- LOOKUP ---------------- #
+    def _expired(self, created: float) -> bool:
+        return time.monotonic() - created > self.ttl_seconds
+
+    def _semantic_lookup(self, vector: np.ndarray) -> Optional[str]:
+        if self._matrix is None:
+            # Expired entries are purged on rebuild...
+            for key in [k for k, (_, _, created) in self._entries.items() if self._expired(created)]:
+                del self._entries[key]
+            self._matrix_keys = [k for k, (_, v, _) in self._entries.items() if v is not None]
+            if not self._matrix_keys:
+                return None
+            self._matrix = np.stack([self._entries[k][1] for k in self._matrix_keys])
+            self._matrix_created = np.array([self._entries[k][2] for k in self._matrix_keys])
+        scores = self._matrix @ vector
+        # ...and those that expired since then are never the match
+        scores[time.monotonic() - self._matrix_created > self.ttl_seconds] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return self._matrix_keys[best]
+
+    def get(self, query: str, vector=None) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Return (answer, query_vector). The answer is None on a miss; the query
+        vector (when computed) should be passed back to put() to avoid
+        embedding the question twice. Pass `vector` if the question is
+        already embedded.
+        """
+        self._check_version()
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and not self._expired(entry[2]):
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[0], entry[1]
+
+        if (vector is None and not self.embed_fn) or self.similarity_threshold > 1:
+            self.misses += 1
+            return None, None
+
+        vector = unit_vector(self.embed_fn(query) if vector is None else vector)
+        with self._lock:
+            match = self._semantic_lookup(vector) if self._entries else None
+            entry = self._entries.get(match) if match else None
+            if entry and not self._expired(entry[2]):
+                self._entries.move_to_end(match)
+                self.semantic_hits += 1
+                return entry[0], vector
+            self.misses += 1
+            return None, vector
+
+    def put(self, query: str, answer: str, vector=None, version=None):
+        """
+        Cache an answer, evicting the least recently used entry when full.
+        `version` is current_version() from before the answer was computed;
+        the write is dropped if the index has been re-ingested since.
+        """
+        if version is not None and self.version_fn and self.version_fn() != version:
+            self.stale_puts += 1
+            return
+        key = normalize_query(query)
+        vector = unit_vector(vector) if vector is not None else None
+        with self._lock:
+            self._entries[key] = (answer, vector, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    # ---------------- REPORTING ---------------- #
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+        }
@@ -1,7 +1,13 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from db import get_connection
-from groq_rag_model import GroqRAGModel
+from chat_history import HISTORY_PAGE_SIZE, fetch_history
+from llm_scheduler import LLMBusyError, get_llm_scheduler
+from metrics import CONTENT_TYPE, render_metrics, span, timed
+from groq_rag_model import LLMCallError
+from model_registry import ModelLoadError
+import chat_service
+from chat_service import (STREAM_HEADERS, RequestError, faq_store, get_groq_model, groq_model_loader,
+                          history_writer)
 import os
 from dotenv import load_dotenv
 import re
@@ -15,15 +21,37 @@ app = Flask(__name__)
 CORS(app)
 
 # -----------------------------
-# ✅ Initialize model globally
+# ✅ Initialize model in the background
 # -----------------------------
-groq_api_key = os.getenv("GROQ_API_KEY")
-if not groq_api_key:
-    raise ValueError("❌ GROQ_API_KEY not found in .env file.")
+# The server binds immediately; /ready reports when the model can take traffic
+if os.getenv("WARMUP_ON_START", "1") == "1":
+    groq_model_loader.start()
+
+
+def preload_before_fork():
+    """
+    Called by gunicorn.conf.py in the master: load the model without starting
+    any thread, so forked workers share its pages copy-on-write.
+    """
+    groq_model_loader.load(warmup=False)
+
 
-app.logger.info("🚀 Loading GroqRAG model...")
-groq_model = GroqRAGModel(groq_api_key=groq_api_key)
-app.logger.info("✅ GroqRAG model loaded successfully.")
+def after_fork():
+    """Called by gunicorn.conf.py in each worker right after fork."""
+    model = groq_model_loader.get(0)
+    model.after_fork()
+    model.embeddings.embed_query("warmup")
+    app.logger.info(f"✅ Worker {os.getpid()} ready.")
+
+
+@app.errorhandler(RequestError)
+@app.errorhandler(TimeoutError)
+@app.errorhandler(ModelLoadError)
+@app.errorhandler(LLMBusyError)
+@app.errorhandler(LLMCallError)
+def service_error(e, endpoint: str = ""):
+    body, status, headers = chat_service.error_response(e, endpoint)
+    return jsonify(body), status, headers
 
 
 # ------------------------------------------------------------------
@@ -99,65 +127,122 @@ def home():
     return jsonify({"message": "Chatbot backend is running!"})
 
 
+@app.route('/ready')
+def ready():
+    """Readiness check: 200 only once the model has finished warming up"""
+    status = groq_model_loader.status()
+    return jsonify(status), (200 if status["ready"] else 503)
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Answer cache hit rate and size"""
+    return jsonify(chat_service.cache_stats())
+
+
+@app.route('/faq/stats')
+def faq_stats():
+    """Precomputed FAQ answers: entries, whether they match the live index, hit rate"""
+    return jsonify(faq_store.stats())
+
+
+@app.route('/db/stats')
+def db_stats():
+    """MySQL connection pool and chat_history writer usage"""
+    return jsonify(chat_service.db_stats())
+
+
+@app.route('/llm/stats')
+def llm_stats():
+    """Groq admission control: running, waiting, rejected and rate-limited calls"""
+    return jsonify(get_llm_scheduler().stats())
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics: per-stage latency histograms and error/cache counters"""
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+
+@app.route('/history')
+def history():
+    """
+    A session's messages, oldest first, a page at a time. Pass the returned
+    next_cursor as ?cursor= to get the page before it.
+    """
+    try:
+        page = fetch_history(
+            request.args.get('session_id', ''),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', HISTORY_PAGE_SIZE, type=int),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify(page)
+
+
 @app.route('/chat', methods=['POST'])
+@timed("/chat")
 def chat():
     """Chat endpoint"""
     try:
-        data = request.get_json()
-        user_message = data.get('message', '').strip()
+        with span("model_ready"):
+            groq_model = get_groq_model()
+        user_message, session_id = chat_service.parse_chat_request(request.get_json(silent=True))
 
-        if not user_message:
-            return jsonify({"error": "Empty message"}), 400
+        with span("history_enqueue"):
+            history_writer.enqueue("user", user_message, session_id)
+        app.logger.info(f"🤖 User: {user_message}")
 
-        conn = get_connection()
-        if not conn:
-            app.logger.error("❌ Database connection failed.")
-            return jsonify({"error": "Database connection failed"}), 500
+        reply = chat_service.answer(groq_model, user_message)
 
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO chat_history (sender, message) VALUES (%s, %s)",
-            ("user", user_message)
-        )
-        conn.commit()
+        with span("history_enqueue"):
+            history_writer.enqueue("bot", json.dumps(reply), session_id)
+        return jsonify({"reply": reply, "session_id": session_id})
 
-        app.logger.info(f"🤖 User: {user_message}")
-        
-        # --- THIS IS THE FIX ---
-        
-        # 1. Get the response from the model (which might be a string)
-        bot_reply_from_model = groq_model.ask(user_message)
-        app.logger.info(f"✅ Bot Raw Output from Model: {bot_reply_from_model}")
-
-        # 2. Parse the string into a Python object (list/dict)
-        parsed_json_reply = bot_reply_from_model
-        if isinstance(bot_reply_from_model, str):
-            try:
-                # This line converts the JSON string into a proper Python list
-                parsed_json_reply = json.loads(bot_reply_from_model)
-            except json.JSONDecodeError:
-                app.logger.error(f"Failed to parse model output as JSON: {bot_reply_from_model}")
-                parsed_json_reply = [{"type": "paragraph", "content": "Sorry, I received an invalid response."}]
-
-        # --- END OF FIX ---
-
-        bot_message_for_db = json.dumps(parsed_json_reply)
-        cursor.execute(
-            "INSERT INTO chat_history (sender, message) VALUES (%s, %s)",
-            ("bot", bot_message_for_db)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+    except Exception as e:
+        return service_error(e, "/chat")
 
-        # 3. Return the fully parsed JSON object to the frontend
-        return jsonify({"reply": parsed_json_reply})
 
-    except Exception as e:
-        app.logger.exception("🔥 Error in /chat endpoint:")
-        return jsonify({"error": str(e)}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming chat endpoint (Server-Sent Events): `token`, `block`, `item`
+    and a final `done` (or `error`) event; see chat_service.stream_events().
+    """
+    user_message, session_id = chat_service.parse_chat_request(request.get_json(silent=True))
+    groq_model = get_groq_model()
+    history_writer.enqueue("user", user_message, session_id)
+    app.logger.info(f"🤖 User (stream): {user_message}")
+
+    return Response(
+        stream_with_context(chat_service.stream_events(groq_model, user_message, session_id)),
+        mimetype="text/event-stream",
+        headers=STREAM_HEADERS,
+    )
+
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """
+    Bulk question answering for regression runs and integrations: takes
+    {"questions": [...]} and streams one NDJSON line per question as soon as
+    it is answered; see chat_service.batch_lines().
+    Batch questions are not written to chat_history.
+    """
+    questions = chat_service.parse_batch_request(request.get_json(silent=True))
+    groq_model = get_groq_model()
+    app.logger.info(f"🤖 Batch of {len(questions)} questions")
+
+    return Response(
+        stream_with_context(chat_service.batch_lines(groq_model, questions)),
+        mimetype="application/x-ndjson",
+        headers=STREAM_HEADERS,
+    )
 
 
 if __name__ == '__main__':
-    app.run(debug=True, use_reloader=False)
\ No newline at end of file
+    app.run(debug=True, use_reloader=False)
@@ -0,0 +1,193 @@
+"""
+Async (ASGI) server exposing the same routes and contract as app.py.
+
+One event loop serves every in-flight conversation: the Groq call is awaited
+through GroqRAGModel.aask() and chat_history rows are handed to the
+write-behind writer, so a slow LLM reply no longer blocks other users.
+
+Run with:  uvicorn asgi_app:app --host 127.0.0.1 --port 5000
+"""
+import os
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+import chat_service
+from chat_history import HISTORY_PAGE_SIZE, fetch_history
+from chat_service import (MODEL_READY_TIMEOUT, STREAM_HEADERS, RequestError, faq_store, groq_model_loader,
+                          history_writer)
+from groq_rag_model import LLMCallError
+from llm_scheduler import LLMBusyError, get_llm_scheduler
+from model_registry import ModelLoadError
+from metrics import CONTENT_TYPE, render_metrics, span, timed
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger("chatbot.asgi")
+logging.basicConfig(level=logging.INFO)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The server binds immediately; /ready reports when the model can take traffic
+    if os.getenv("WARMUP_ON_START", "1") == "1":
+        groq_model_loader.start()
+    yield
+    await asyncio.to_thread(history_writer.stop)
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+def service_error(e: Exception, endpoint: str = "") -> JSONResponse:
+    body, status, headers = chat_service.error_response(e, endpoint)
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+async def handle_service_error(request: Request, e: Exception) -> JSONResponse:
+    return service_error(e)
+
+
+for error_type in (RequestError, TimeoutError, ModelLoadError, LLMBusyError, LLMCallError):
+    app.add_exception_handler(error_type, handle_service_error)
+
+
+async def get_groq_model():
+    return await asyncio.to_thread(groq_model_loader.get, MODEL_READY_TIMEOUT)
+
+
+async def read_json(request: Request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def save_message(sender: str, message: str, session_id: str):
+    # Only waits (off the event loop) when the writer applies backpressure
+    if not history_writer.enqueue(sender, message, session_id, block=False):
+        await asyncio.to_thread(history_writer.enqueue, sender, message, session_id)
+
+
+@app.get("/")
+async def home():
+    """Basic health check"""
+    return {"message": "Chatbot backend is running!"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness check: 200 only once the model has finished warming up"""
+    status = groq_model_loader.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Answer cache hit rate and size"""
+    return chat_service.cache_stats()
+
+
+@app.get("/faq/stats")
+async def faq_stats():
+    """Precomputed FAQ answers: entries, whether they match the live index, hit rate"""
+    return faq_store.stats()
+
+
+@app.get("/db/stats")
+async def db_stats():
+    """MySQL connection pool and chat_history writer usage"""
+    return chat_service.db_stats()
+
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """Groq admission control: running, waiting, rejected and rate-limited calls"""
+    return get_llm_scheduler().stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms and error/cache counters"""
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+
+@app.get("/history")
+async def history(session_id: str = "", cursor: Optional[str] = None, limit: int = HISTORY_PAGE_SIZE):
+    """
+    A session's messages, oldest first, a page at a time. Pass the returned
+    next_cursor as ?cursor= to get the page before it.
+    """
+    try:
+        return await asyncio.to_thread(fetch_history, session_id, cursor, limit)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except RuntimeError as e:
+        return JSONResponse({"error": str(e)}, status_code=503)
+
+
+@app.post("/chat")
+@timed("/chat")
+async def chat(request: Request):
+    """Chat endpoint"""
+    try:
+        with span("model_ready"):
+            groq_model = await get_groq_model()
+        user_message, session_id = chat_service.parse_chat_request(await read_json(request))
+
+        with span("history_enqueue"):
+            await save_message("user", user_message, session_id)
+        logger.info(f"🤖 User: {user_message}")
+
+        reply = await chat_service.aanswer(groq_model, user_message)
+
+        with span("history_enqueue"):
+            await save_message("bot", json.dumps(reply), session_id)
+        return {"reply": reply, "session_id": session_id}
+
+    except Exception as e:
+        return service_error(e, "/chat")
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request):
+    """
+    Streaming chat endpoint (Server-Sent Events), with the same `token`,
+    `block`, `item`, `done` and `error` events as app.py.
+    """
+    user_message, session_id = chat_service.parse_chat_request(await read_json(request))
+    groq_model = await get_groq_model()
+    await save_message("user", user_message, session_id)
+    logger.info(f"🤖 User (stream): {user_message}")
+
+    # A plain generator: Starlette iterates it in a worker thread, off the event loop
+    return StreamingResponse(chat_service.stream_events(groq_model, user_message, session_id),
+                             media_type="text/event-stream", headers=STREAM_HEADERS)
+
+
+@app.post("/chat/batch")
+async def chat_batch(request: Request):
+    """
+    Bulk question answering: takes {"questions": [...]} and streams one
+    NDJSON line per question as it is answered (see app.py).
+    """
+    questions = chat_service.parse_batch_request(await read_json(request))
+    groq_model = await get_groq_model()
+    logger.info(f"🤖 Batch of {len(questions)} questions")
+
+    # A plain generator: Starlette iterates it in a worker thread, off the event loop
+    return StreamingResponse(chat_service.batch_lines(groq_model, questions),
+                             media_type="application/x-ndjson", headers=STREAM_HEADERS)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=5000)
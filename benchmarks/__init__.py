@@ -0,0 +1,11 @@
+"""
+Benchmark suite. Run from the repository root:
+
+    python -m benchmarks.bench_ingest      # pages/sec and chunks/sec for ingestion
+    python -m benchmarks.bench_retrieval   # search p50/p99 by k, corpus size and backend
+    python -m benchmarks.bench_chat        # /chat load test against fake_groq_server.py and SQLite
+
+Every run works in a throw-away directory on synthetic data and writes a
+JSON report (environment, parameters, results) to benchmarks/results/, so
+two commits can be compared by diffing their reports.
+"""
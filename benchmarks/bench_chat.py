@@ -0,0 +1,206 @@
+"""
+End-to-end /chat load test.
+
+Builds a small Chroma DB from synthetic PDFs, starts fake_groq_server.py as
+the LLM, swaps MySQL for a SQLite stand-in (db.get_connection is replaced
+before the app is imported), serves app.py on a local port and fires
+concurrent requests at it. Reports throughput, latency percentiles, status
+codes, persisted chat_history rows and the per-stage timings from
+metrics.py.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import REPO_ROOT, make_synthetic_pdfs, percentiles, scratch_directory, write_results
+
+
+# --------------- SQLITE STAND-IN FOR MYSQL --------------- #
+class SQLiteCursor:
+    """Accepts the MySQL paramstyle (%s) used throughout the project."""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, params=()):
+        self._cursor.execute(sql.replace("%s", "?"), params)
+
+    def executemany(self, sql: str, rows):
+        self._cursor.executemany(sql.replace("%s", "?"), rows)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, timeout=30)
+
+    def cursor(self, *args, **kwargs):
+        return SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def sqlite_connection_factory(path: str):
+    # SQLite version of chat_history.CREATE_TABLE_SQL (set HISTORY_MANAGE_SCHEMA=0)
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, sender TEXT NOT NULL, "
+            "message TEXT NOT NULL, created_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_session ON chat_history (session_id, id)")
+    return lambda: SQLiteConnection(path)
+
+
+# --------------- HARNESS --------------- #
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5):
+                return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise TimeoutError(f"{url} did not come up within {timeout}s")
+
+
+def post_chat(base_url: str, message: str):
+    request = urllib.request.Request(
+        f"{base_url}/chat", data=json.dumps({"message": message}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            body = json.loads(response.read())
+            status = response.status
+    except urllib.error.HTTPError as e:
+        body, status = {}, e.code
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        body, status = {}, 0
+    return status, time.perf_counter() - started, isinstance(body.get("reply"), list)
+
+
+def stage_summary() -> dict:
+    from metrics import STAGE_SECONDS
+
+    summary = {}
+    for (stage,), (_, total, count) in STAGE_SECONDS._series.items():
+        summary[stage] = {"count": count, "mean_ms": round(total / count * 1000, 3)}
+    return summary
+
+
+def run(args) -> dict:
+    from create_vector_db import sync_pdfs_to_vectordb
+
+    pdf_files, pages = make_synthetic_pdfs("./pdfs", args.pdfs, 10)
+    sync_pdfs_to_vectordb(pdf_files, persist_directory="./chroma_db", rebuild=True)
+
+    llm_port, app_port = free_port(), free_port()
+    fake_llm = subprocess.Popen([
+        sys.executable, os.path.join(REPO_ROOT, "fake_groq_server.py"), "--port", str(llm_port),
+        "--rpm", str(args.rpm), "--latency", str(args.llm_latency),
+    ])
+    try:
+        wait_for(f"http://127.0.0.1:{llm_port}/", 30)
+        os.environ.update({
+            "GROQ_API_KEY": "benchmark",
+            "GROQ_API_BASE": f"http://127.0.0.1:{llm_port}",
+            "RETRIEVER_BACKEND": args.backend,
+            # The scheduler learns the quota the fake server enforces
+            "LLM_REQUESTS_PER_MINUTE": str(args.rpm),
+            "LLM_TOKENS_PER_MINUTE": "0",
+            # Unique questions, and no semantic answer-cache hits between them
+            "ANSWER_CACHE_SIMILARITY": "1.01",
+            # The SQLite stand-in creates its own chat_history table
+            "HISTORY_MANAGE_SCHEMA": "0",
+        })
+
+        import db
+        db.get_connection = sqlite_connection_factory(os.path.abspath("chat_history.sqlite3"))
+        import app as chat_app
+        from werkzeug.serving import make_server
+
+        chat_app.groq_model_loader.get(timeout=600)
+        server = make_server("127.0.0.1", app_port, chat_app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{app_port}"
+
+        messages = [f"What financing support is available for {args.topic} number {i}?" for i in range(args.requests)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            responses = list(pool.map(lambda m: post_chat(base_url, m), messages))
+        elapsed = time.perf_counter() - started
+        server.shutdown()
+        chat_app.history_writer.stop()
+
+        statuses = {}
+        for status, _, _ in responses:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        with sqlite3.connect("chat_history.sqlite3") as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM chat_history").fetchone()[0]
+        return {
+            "requests": len(responses),
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(len(responses) / elapsed, 2),
+            "latency": percentiles([latency for _, latency, _ in responses]),
+            "ok_latency": percentiles([latency for status, latency, ok in responses if status == 200 and ok]),
+            "statuses": statuses,
+            "json_replies": sum(1 for _, _, ok in responses if ok),
+            "history_rows": rows,
+            "llm_scheduler": chat_app.get_llm_scheduler().stats(),
+            "stages": stage_summary(),
+        }
+    finally:
+        fake_llm.terminate()
+        fake_llm.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test /chat against a fake LLM and SQLite.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per fake completion")
+    parser.add_argument("--rpm", type=int, default=0, help="Fake LLM requests/minute quota (0 = unlimited)")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--pdfs", type=int, default=5, help="Synthetic PDFs (10 pages each) in the corpus")
+    parser.add_argument("--topic", default="scheme")
+    args = parser.parse_args()
+
+    with scratch_directory():
+        results = run(args)
+    print(f"[INFO] {results['throughput_rps']} req/s, latency {results['latency']}, statuses {results['statuses']}")
+    write_results("chat", vars(args), results)
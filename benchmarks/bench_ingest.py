@@ -0,0 +1,95 @@
+"""
+Ingestion throughput on synthetic PDFs: pages/sec and chunks/sec for
+extraction alone, create_vector_db_from_pdfs (full rebuild and no-op
+re-sync) and PDFGroqRAG.ingest_pdfs.
+"""
+import os
+import time
+import shutil
+import argparse
+
+from benchmarks.common import make_synthetic_pdfs, scratch_directory, write_results
+
+
+def _rates(seconds: float, pages: int, chunks: int) -> dict:
+    return {
+        "seconds": round(seconds, 3),
+        "pages_per_sec": round(pages / seconds, 2) if seconds else None,
+        "chunks_per_sec": round(chunks / seconds, 2) if seconds else None,
+    }
+
+
+def _cold_embedding_cache():
+    # Every timed run embeds from scratch instead of hitting the previous run's vectors
+    from embedding_cache import EMBED_CACHE_DIR
+
+    shutil.rmtree(EMBED_CACHE_DIR, ignore_errors=True)
+
+
+def bench_extraction(pdf_files, pages: int, workers: int) -> dict:
+    from create_vector_db import iter_pdf_chunks
+
+    started = time.perf_counter()
+    chunks = sum(1 for _ in iter_pdf_chunks(pdf_files, workers=workers))
+    return {"chunks": chunks, **_rates(time.perf_counter() - started, pages, chunks)}
+
+
+def bench_create_vector_db(pdf_dir: str, pages: int, chunks: int, workers: int) -> dict:
+    import create_vector_db
+
+    create_vector_db.PDF_FOLDER = pdf_dir
+    _cold_embedding_cache()
+    started = time.perf_counter()
+    create_vector_db.create_vector_db_from_pdfs(workers=workers, rebuild=True)
+    rebuild = _rates(time.perf_counter() - started, pages, chunks)
+
+    # Nothing changed: the manifest should make this close to free
+    started = time.perf_counter()
+    create_vector_db.create_vector_db_from_pdfs(workers=workers)
+    return {"rebuild": rebuild, "resync_noop_seconds": round(time.perf_counter() - started, 3)}
+
+
+def bench_pdf_rag(pdf_dir: str, pages: int, workers: int) -> dict:
+    from pdf_rag_groq import PDFGroqRAG
+
+    rag = PDFGroqRAG(groq_api_key="benchmark", persist_directory="./chroma_db_pdf_rag")
+    _cold_embedding_cache()
+    started = time.perf_counter()
+    rag.ingest_pdfs(pdf_dir, workers=workers, rebuild=True)
+    return {"chunks": rag.chunk_count, **_rates(time.perf_counter() - started, pages, rag.chunk_count)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PDF ingestion on synthetic PDFs.")
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10, help="Pages per PDF")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}",
+                        help="Comma-separated worker counts to compare")
+    parser.add_argument("--skip-pdf-rag", action="store_true", help="Skip PDFGroqRAG.ingest_pdfs")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    args = parser.parse_args()
+
+    from create_vector_db import EMBED_MODEL
+    from model_registry import get_embeddings
+
+    worker_counts = sorted({int(w) for w in args.workers.split(",")})
+    results = []
+    # Model loading is a one-off per process; keep it out of the timings
+    get_embeddings(EMBED_MODEL).embed_documents(["warmup"])
+    with scratch_directory(keep=args.keep) as scratch:
+        pdf_dir = os.path.join(scratch, "pdfs")
+        pdf_files, pages = make_synthetic_pdfs(pdf_dir, args.files, args.pages)
+        print(f"[INFO] Generated {len(pdf_files)} PDFs ({pages} pages).")
+        for workers in worker_counts:
+            extraction = bench_extraction(pdf_files, pages, workers)
+            run = {
+                "workers": workers,
+                "extraction": extraction,
+                "create_vector_db_from_pdfs": bench_create_vector_db(pdf_dir, pages, extraction["chunks"], workers),
+            }
+            if not args.skip_pdf_rag:
+                run["pdf_rag_ingest_pdfs"] = bench_pdf_rag(pdf_dir, pages, workers)
+            print(f"[INFO] workers={workers}: {run}")
+            results.append(run)
+
+    write_results("ingest", vars(args), results)
@@ -0,0 +1,138 @@
+"""
+Retrieval latency (p50/p99) by corpus size, k and backend: Chroma and the
+memory-mapped NumPy index in float32 and int8. Corpora are random unit
+vectors of the embedding model's dimension, so no model is needed unless
+--embedding is given, which also measures query embedding alone and with
+concurrent callers going through the micro-batching embedder.
+"""
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from benchmarks.common import percentiles, scratch_directory, write_results
+
+ADD_BATCH_SIZE = 5000  # under Chroma's max batch size
+
+
+def build_collection(size: int, dim: int, rng: np.random.Generator):
+    from langchain_community.vectorstores import Chroma
+
+    vectordb = Chroma(collection_name=f"bench_{size}", persist_directory="./chroma_db")
+    vectors = rng.normal(size=(size, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    for start in range(0, size, ADD_BATCH_SIZE):
+        end = min(size, start + ADD_BATCH_SIZE)
+        vectordb._collection.add(
+            ids=[f"doc-{i}" for i in range(start, end)],
+            embeddings=vectors[start:end].tolist(),
+            documents=[f"Synthetic chunk {i}" for i in range(start, end)],
+            metadatas=[{"source": "synthetic", "page": i} for i in range(start, end)],
+        )
+    return vectordb, vectors
+
+
+def time_queries(search, queries, k: int) -> dict:
+    search(queries[0], k)  # first call pays lazy initialisation
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query, k)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def bench_backends(size: int, ks, queries_count: int, dim: int, seed: int) -> list:
+    from numpy_index import NumpyVectorIndex, export_collection
+
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    vectordb, vectors = build_collection(size, dim, rng)
+    print(f"[INFO] Built {size}-vector collection in {time.perf_counter() - started:.1f}s")
+    # Queries near real rows, like questions close to some chunk
+    rows = rng.integers(0, size, queries_count)
+    queries = (vectors[rows] + 0.5 * rng.normal(size=(queries_count, dim)) / np.sqrt(dim)).astype(np.float32)
+    query_lists = [q.tolist() for q in queries]
+
+    backends = {"chroma": lambda q, k: vectordb.similarity_search_by_vector(q, k=k)}
+    for dtype in ("float32", "int8"):
+        index_dir = f"./numpy_index_{size}_{dtype}"
+        export_collection(vectordb, index_dir, dtype=dtype, index_version=f"bench-{size}")
+        backends[f"numpy_{dtype}"] = NumpyVectorIndex(index_dir).similarity_search_by_vector
+
+    results = []
+    for backend, search in backends.items():
+        for k in ks:
+            stats = time_queries(search, query_lists, k)
+            print(f"[INFO] size={size} k={k} {backend}: p50={stats['p50_ms']}ms p99={stats['p99_ms']}ms")
+            results.append({"corpus_size": size, "k": k, "backend": backend, **stats})
+    vectordb.delete_collection()
+    return results
+
+
+def bench_query_embedding(queries_count: int, concurrency: int) -> dict:
+    from create_vector_db import EMBED_MODEL
+    from model_registry import get_embeddings
+    from query_embedder import BatchingQueryEmbedder
+
+    base = get_embeddings(EMBED_MODEL)
+    base.embed_query("warmup")
+    questions = [f"What subsidy is available for scheme number {i}?" for i in range(queries_count)]
+    sequential = []
+    for question in questions:
+        started = time.perf_counter()
+        base.embed_query(question)
+        sequential.append(time.perf_counter() - started)
+
+    def concurrent(embedder) -> dict:
+        samples, lock = [], threading.Lock()
+        pending = iter(questions)
+
+        def worker():
+            for question in pending:
+                started = time.perf_counter()
+                embedder.embed_query(question)
+                with lock:
+                    samples.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {"queries_per_sec": round(len(samples) / elapsed, 2), **percentiles(samples)}
+
+    batching = BatchingQueryEmbedder(base)
+    return {
+        "sequential": percentiles(sequential),
+        "concurrent_unbatched": concurrent(base),
+        "concurrent_batched": {**concurrent(batching), **batching.stats},
+        "concurrency": concurrency,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency.")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated corpus sizes")
+    parser.add_argument("--k", default="1,3,10", help="Comma-separated k values")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384, help="Vector dimension (all-MiniLM-L6-v2: 384)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embedding", action="store_true", help="Also benchmark query embedding")
+    parser.add_argument("--concurrency", type=int, default=16, help="Threads for the embedding benchmark")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    ks = [int(k) for k in args.k.split(",")]
+    results = {"search": []}
+    with scratch_directory():
+        for size in sizes:
+            results["search"].extend(bench_backends(size, ks, args.queries, args.dim, args.seed))
+    if args.embedding:
+        results["query_embedding"] = bench_query_embedding(args.queries, args.concurrency)
+        print(f"[INFO] Query embedding: {results['query_embedding']}")
+
+    write_results("retrieval", vars(args), results)
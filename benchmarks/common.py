@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# Benchmarks import the project's top-level modules
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# Always the ./chroma_db of the scratch directory, never a configured store
+os.environ["CHROMA_DB_PATH"] = "./chroma_db"
+os.environ["SHARD_BY"] = "none"
+
+VOCABULARY = (
+    "scheme loan credit subsidy farmer msme enterprise grant interest rate collateral bank "
+    "eligibility application document registration turnover export capital guarantee startup "
+    "women rural urban district ministry portal benefit repayment margin term working "
+    "manufacturing services training skill technology innovation cluster infrastructure"
+).split()
+
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    """Summary of latency samples given in seconds, reported in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p90_ms": round(pick(0.90) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write_results(name: str, params: dict, results, out_dir: str = RESULTS_DIR) -> str:
+    """Write one machine-readable report and return its path."""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"benchmark": name, "environment": environment(), "params": params, "results": results}, f, indent=2)
+    print(f"[SUCCESS] Results written to {path}")
+    return path
+
+
+def synthetic_text(rng: random.Random, words: int) -> str:
+    sentences, sentence = [], []
+    for _ in range(words):
+        sentence.append(rng.choice(VOCABULARY) if rng.random() > 0.1 else str(rng.randint(1, 9999)))
+        if len(sentence) >= rng.randint(8, 20):
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            sentence = []
+    if sentence:
+        sentences.append(" ".join(sentence).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def make_synthetic_pdfs(folder: str, files: int, pages_per_file: int, words_per_page: int = 350,
+                        seed: int = 0) -> Tuple[List[str], int]:
+    """Write `files` text PDFs of `pages_per_file` pages each. Returns (paths, total pages)."""
+    import fitz  # PyMuPDF
+
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(files):
+        doc = fitz.open()
+        for _ in range(pages_per_file):
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(36, 36, page.rect.width - 36, page.rect.height - 36),
+                                synthetic_text(rng, words_per_page), fontsize=8)
+        path = os.path.join(folder, f"synthetic_{i:04d}.pdf")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths, files * pages_per_file
+
+
+@contextmanager
+def scratch_directory(keep: bool = False):
+    """chdir into a fresh temporary directory, so ./chroma_db and friends land there."""
+    previous = os.getcwd()
+    path = tempfile.mkdtemp(prefix="chatbot-bench-")
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+        if keep:
+            print(f"[INFO] Kept benchmark directory {path}")
+        else:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,231 @@
+"""
+chat_history table: managed schema and the session-scoped read path.
+
+Rows are written by history_writer.py, each tagged with the session that
+produced it. GET /history reads a session newest-first with keyset
+pagination: a page is `WHERE session_id = ? AND id < cursor ORDER BY id DESC
+LIMIT n` on the (session_id, id) index, so its cost does not depend on how
+deep the page is or how large the table grows (OFFSET would scan every
+skipped row).
+
+Run `python chat_history.py` to create or migrate the table. At runtime the
+writer and the read path only check it once per process and log anything
+missing, unless HISTORY_MANAGE_SCHEMA=1 lets them apply the migration.
+"""
+import os
+import re
+import json
+import uuid
+import logging
+import threading
+from typing import Callable, Optional
+
+from db import get_connection
+from metrics import DB_ERRORS, span
+
+# --------------- CONFIGURATION --------------- #
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 200))
+# 1 = servers create/migrate the table on first use; 0 = they only check it
+# (DDL on a live table can lock it, so migrating is an explicit step)
+HISTORY_MANAGE_SCHEMA = os.getenv("HISTORY_MANAGE_SCHEMA", "0") == "1"
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS chat_history (
+    id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+    session_id VARCHAR(64) NULL,
+    sender VARCHAR(16) NOT NULL,
+    message MEDIUMTEXT NOT NULL,
+    created_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+    PRIMARY KEY (id),
+    KEY idx_chat_history_session (session_id, id),
+    KEY idx_chat_history_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+# Brings a table created by an older version up to date, in this order
+MIGRATIONS = [
+    ("column", "id", "ALTER TABLE chat_history ADD COLUMN id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY FIRST"),
+    ("column", "session_id", "ALTER TABLE chat_history ADD COLUMN session_id VARCHAR(64) NULL AFTER id"),
+    ("column", "created_at",
+     "ALTER TABLE chat_history ADD COLUMN created_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3)"),
+    ("index", "idx_chat_history_session", "ALTER TABLE chat_history ADD INDEX idx_chat_history_session (session_id, id)"),
+    ("index", "idx_chat_history_created_at",
+     "ALTER TABLE chat_history ADD INDEX idx_chat_history_created_at (created_at)"),
+]
+
+# MySQL errors meaning another process already applied the same change
+ER_DUP_FIELDNAME, ER_DUP_KEYNAME, ER_MULTIPLE_PRI_KEY = 1060, 1061, 1068
+
+PAGE_SQL = ("SELECT id, sender, message, created_at FROM chat_history "
+            "WHERE session_id = %s ORDER BY id DESC LIMIT %s")
+PAGE_BEFORE_SQL = ("SELECT id, sender, message, created_at FROM chat_history "
+                   "WHERE session_id = %s AND id < %s ORDER BY id DESC LIMIT %s")
+
+logger = logging.getLogger("chatbot.history")
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+# --------------- SCHEMA --------------- #
+def _existing(cursor, sql: str) -> set:
+    cursor.execute(sql)
+    return {name for (name,) in cursor.fetchall()}
+
+
+def _missing(cursor) -> Optional[list]:
+    """The MIGRATIONS an existing table still needs, or None if there is no table."""
+    columns = _existing(cursor, "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'chat_history'")
+    if not columns:
+        return None
+    indexes = _existing(cursor, "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+                                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'chat_history'")
+    return [m for m in MIGRATIONS if m[1] not in (columns if m[0] == "column" else indexes)]
+
+
+def _migrate(cursor, missing: Optional[list]):
+    if missing is None:
+        cursor.execute(CREATE_TABLE_SQL)
+        logger.info("Created chat_history table")
+        return
+    for kind, name, sql in missing:
+        logger.info("Migrating chat_history: adding %s %s", kind, name)
+        try:
+            cursor.execute(sql)
+        except Exception as e:
+            if getattr(e, "errno", None) not in (ER_DUP_FIELDNAME, ER_DUP_KEYNAME, ER_MULTIPLE_PRI_KEY):
+                raise
+
+
+def ensure_schema(connection_factory: Callable = get_connection, migrate: Optional[bool] = None) -> bool:
+    """
+    Check chat_history once per process. With `migrate` (default:
+    HISTORY_MANAGE_SCHEMA) create the table or add the columns and indexes
+    an older table lacks; otherwise log what is missing and leave it.
+    Returns False (and retries on the next call) if the database is
+    unreachable or a migration fails.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return True
+    migrate = HISTORY_MANAGE_SCHEMA if migrate is None else migrate
+    with _schema_lock:
+        if _schema_ready:
+            return True
+        conn = connection_factory()
+        if conn is None:
+            return False
+        try:
+            cursor = conn.cursor()
+            missing = _missing(cursor)
+            if migrate:
+                _migrate(cursor, missing)
+                conn.commit()
+            elif missing is None:
+                logger.warning("chat_history table does not exist; run `python chat_history.py` to create it")
+            elif missing:
+                logger.warning("chat_history is missing %s; run `python chat_history.py` to migrate it",
+                               ", ".join(f"{kind} {name}" for kind, name, _ in missing))
+            cursor.close()
+            _schema_ready = True
+            return True
+        except Exception as e:
+            DB_ERRORS.inc(operation="history_schema")
+            if not migrate:
+                # Only advisory: a database that cannot answer the check is not asked again
+                _schema_ready = True
+                logger.warning("Could not check the chat_history schema: %s", e)
+                return True
+            logger.error("Could not create or migrate chat_history: %s", e)
+            return False
+        finally:
+            conn.close()
+
+
+# --------------- READ PATH --------------- #
+def resolve_session_id(value: Optional[str]) -> str:
+    """Return the client's session id, or a new one if it sent none. Raises ValueError if malformed."""
+    if not value:
+        return uuid.uuid4().hex
+    if not SESSION_ID_PATTERN.match(value):
+        raise ValueError("session_id must be 8-64 characters of letters, digits, '-' or '_'")
+    return value
+
+
+def _decode_message(sender: str, message: str):
+    # Bot rows hold the JSON reply /chat returned; user rows are plain text
+    if sender != "bot":
+        return message
+    try:
+        return json.loads(message)
+    except (TypeError, ValueError):
+        return [{"type": "paragraph", "content": message}]
+
+
+def fetch_history(session_id: str, cursor: Optional[str] = None, limit: int = HISTORY_PAGE_SIZE,
+                  connection_factory: Callable = get_connection) -> dict:
+    """
+    One page of a session's messages, oldest first. `cursor` is the
+    next_cursor of the previous (newer) page; next_cursor is None once the
+    start of the conversation is reached.
+    Raises ValueError for a bad session id, cursor or limit and
+    RuntimeError if the database is unreachable.
+    """
+    if not session_id or not SESSION_ID_PATTERN.match(session_id):
+        raise ValueError("A valid session_id is required")
+    if cursor is not None:
+        if not cursor.isdigit():
+            raise ValueError("Invalid cursor")
+        cursor = int(cursor)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    limit = min(limit, HISTORY_MAX_PAGE_SIZE)
+
+    ensure_schema(connection_factory)
+    conn = connection_factory()
+    if conn is None:
+        raise RuntimeError("Could not connect to MySQL to read chat_history.")
+    try:
+        with span("history_read"):
+            db_cursor = conn.cursor()
+            # One extra row tells whether an older page exists
+            if cursor is None:
+                db_cursor.execute(PAGE_SQL, (session_id, limit + 1))
+            else:
+                db_cursor.execute(PAGE_BEFORE_SQL, (session_id, cursor, limit + 1))
+            rows = db_cursor.fetchall()
+            db_cursor.close()
+    except Exception:
+        DB_ERRORS.inc(operation="history_read")
+        raise
+    finally:
+        conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    messages = [
+        {
+            "id": row_id,
+            "sender": sender,
+            "message": _decode_message(sender, message),
+            "created_at": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at,
+        }
+        for row_id, sender, message, created_at in reversed(rows)
+    ]
+    return {
+        "session_id": session_id,
+        "messages": messages,
+        "next_cursor": str(rows[-1][0]) if has_more else None,
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if ensure_schema(migrate=True):
+        print("[SUCCESS] chat_history schema is up to date.")
+    else:
+        print("[ERROR] Could not create or migrate chat_history.")
@@ -0,0 +1,226 @@
+"""
+Request handling shared by app.py (Flask) and asgi_app.py (FastAPI).
+
+Validation, the FAQ -> LLM -> JSON pipeline, the SSE and NDJSON response
+bodies and the mapping of failures to status codes live here; the servers
+only adapt them to their framework's request and response objects.
+"""
+import os
+import json
+import asyncio
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from chat_history import resolve_session_id
+from db import pool_stats
+from faq_answers import FAQStore
+from groq_rag_model import GroqRAGModel, LLMCallError, parse_answer_json
+from history_writer import get_history_writer
+from json_stream import IncrementalJSONParser, sse_event
+from llm_scheduler import LLMBusyError
+from metrics import JSON_PARSE_FAILURES, span, timed
+from model_registry import BackgroundLoader, ModelLoadError
+
+# Load environment variables
+load_dotenv()
+
+# --------------- CONFIGURATION --------------- #
+groq_api_key = os.getenv("GROQ_API_KEY")
+if not groq_api_key:
+    raise ValueError("❌ GROQ_API_KEY not found in .env file.")
+
+# Seconds a request waits for warmup before getting a 503
+MODEL_READY_TIMEOUT = float(os.getenv("MODEL_READY_TIMEOUT", 30))
+# Most questions accepted by one /chat/batch call
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", 1000))
+INVALID_REPLY_TEXT = "Sorry, I received an invalid response."
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+logger = logging.getLogger("chatbot.chat")
+
+
+class RequestError(ValueError):
+    """The request body is invalid; answered with a 400."""
+
+
+# --------------- MODEL & STORES --------------- #
+def load_groq_model(warmup: bool = True) -> GroqRAGModel:
+    logger.info("🚀 Loading GroqRAG model...")
+    model = GroqRAGModel(groq_api_key=groq_api_key)
+    # The first forward pass is much slower than the rest; pay it during warmup
+    if warmup:
+        model.embeddings.embed_query("warmup")
+    logger.info("✅ GroqRAG model loaded successfully.")
+    return model
+
+
+# The servers bind immediately; /ready reports when the model can take traffic
+groq_model_loader = BackgroundLoader(load_groq_model, name="GroqRAGModel")
+
+# chat_history rows are written in batches by a background thread
+history_writer = get_history_writer()
+
+# Answers precomputed by faq_answers.py for the most frequent questions
+faq_store = FAQStore()
+
+
+def get_groq_model() -> GroqRAGModel:
+    """
+    Return the loaded model, waiting up to MODEL_READY_TIMEOUT for warmup.
+    Raises TimeoutError or ModelLoadError, both answered with a 503.
+    """
+    return groq_model_loader.get(timeout=MODEL_READY_TIMEOUT)
+
+
+def cache_stats() -> dict:
+    """Answer cache hit rate and size"""
+    if not groq_model_loader.ready:
+        return {"enabled": False, "ready": False}
+    groq_model = groq_model_loader.value
+    coalescing = {"coalescing": groq_model.coalescing_stats()}
+    if not groq_model.answer_cache:
+        return {"enabled": False, **coalescing}
+    return {"enabled": True, **groq_model.answer_cache.stats(), **coalescing}
+
+
+def db_stats() -> dict:
+    """MySQL connection pool and chat_history writer usage"""
+    return {"pool": pool_stats(), "history_writer": history_writer.stats}
+
+
+# --------------- ERRORS --------------- #
+def error_response(e: Exception, endpoint: str = "") -> Tuple[dict, int, dict]:
+    """Map a failure to (body, status, headers). Unexpected errors are logged and answered with a 500."""
+    if isinstance(e, RequestError):
+        return {"error": str(e)}, 400, {}
+    if isinstance(e, (TimeoutError, ModelLoadError)):
+        return {"error": str(e)}, 503, {}
+    if isinstance(e, LLMBusyError):
+        # The Groq quota or wait queue could not admit the call: ask the client to retry
+        return {"error": str(e)}, 503, {"Retry-After": str(int(e.retry_after + 0.999))}
+    if isinstance(e, LLMCallError):
+        return {"error": "The language model request failed."}, 502, {}
+    logger.exception(f"🔥 Error in {endpoint or 'request'}:")
+    return {"error": str(e)}, 500, {}
+
+
+# --------------- VALIDATION --------------- #
+def parse_chat_request(data) -> Tuple[str, str]:
+    """Return (message, session_id) from a /chat or /chat/stream body."""
+    message = data.get("message") if isinstance(data, dict) else None
+    if not isinstance(message, str) or not message.strip():
+        raise RequestError("Empty message")
+    try:
+        session_id = resolve_session_id(data.get("session_id"))
+    except ValueError as e:
+        raise RequestError(str(e)) from e
+    return message.strip(), session_id
+
+
+def parse_batch_request(data) -> List[str]:
+    """Return the questions of a /chat/batch body."""
+    questions = data.get("questions") if isinstance(data, dict) else None
+    if not isinstance(questions, list) or not questions or \
+            not all(isinstance(q, str) and q.strip() for q in questions):
+        raise RequestError("questions must be a non-empty list of non-empty strings")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise RequestError(f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+    return questions
+
+
+# --------------- ANSWERING --------------- #
+def parse_reply(answer, endpoint: str) -> Tuple[list, bool]:
+    """
+    The reply sent to the client: the answer's JSON, or an apology if it is
+    not valid JSON. Returns (reply, ok).
+    """
+    with span("json_parse"):
+        reply, ok = parse_answer_json(answer)
+    if not ok:
+        JSON_PARSE_FAILURES.inc(endpoint=endpoint)
+        logger.error(f"Failed to parse model output as JSON: {answer}")
+        reply = [{"type": "paragraph", "content": INVALID_REPLY_TEXT}]
+    return reply, ok
+
+
+def answer(groq_model: GroqRAGModel, message: str) -> list:
+    """A precomputed FAQ answer, else the model's. Raises LLMBusyError / LLMCallError."""
+    with span("faq_lookup"):
+        raw_answer, query_vector = faq_store.get(message, groq_model.embeddings.embed_query)
+    if raw_answer is None:
+        with span("ask"):
+            raw_answer = groq_model.ask(message, query_vector)
+    logger.info(f"✅ Bot Raw Output from Model: {raw_answer}")
+    return parse_reply(raw_answer, "/chat")[0]
+
+
+async def aanswer(groq_model: GroqRAGModel, message: str) -> list:
+    """Async variant of answer(): the FAQ lookup (which may embed) runs in a worker thread."""
+    with span("faq_lookup"):
+        raw_answer, query_vector = await asyncio.to_thread(
+            faq_store.get, message, groq_model.embeddings.embed_query)
+    if raw_answer is None:
+        with span("ask"):
+            raw_answer = await groq_model.aask(message, query_vector)
+    logger.info(f"✅ Bot Raw Output from Model: {raw_answer}")
+    return parse_reply(raw_answer, "/chat")[0]
+
+
+@timed("/chat/stream")
+def stream_events(groq_model: GroqRAGModel, message: str, session_id: str) -> Iterator[str]:
+    """
+    /chat/stream body: `token` events with raw LLM text as it arrives,
+    `block`/`item` events as each header/section/scheme object of the JSON
+    reply closes, and a final `done` event carrying the same reply /chat
+    would return (or an `error` event).
+    """
+    parser = IncrementalJSONParser()
+    try:
+        with span("faq_lookup"):
+            faq_answer, query_vector = faq_store.get(message, groq_model.embeddings.embed_query)
+        texts = [faq_answer] if faq_answer is not None else groq_model.stream(message, query_vector)
+        # Includes the time the client takes to read each event
+        with span("ask"):
+            for text in texts:
+                yield sse_event("token", {"text": text})
+                for event, payload in parser.feed(text):
+                    yield sse_event(event, payload)
+
+        reply, _ = parse_reply(parser.text, "/chat/stream")
+        history_writer.enqueue("bot", json.dumps(reply), session_id)
+        yield sse_event("done", {"reply": reply, "session_id": session_id})
+    except LLMBusyError as e:
+        yield sse_event("error", {"error": str(e), "code": "rate_limited", "retry_after": e.retry_after})
+    except Exception as e:
+        logger.exception("🔥 Error in /chat/stream endpoint:")
+        yield sse_event("error", {"error": str(e)})
+
+
+@timed("/chat/batch")
+def batch_lines(groq_model: GroqRAGModel, questions: List[str]) -> Iterator[str]:
+    """
+    /chat/batch body: one NDJSON line per question as soon as it is answered
+    (completion order, not input order):
+    {"index": i, "question": ..., "reply": ..., "ok": true|false, "error": ...}.
+    "error" is null, "rate_limited" (the Groq quota could not admit the call
+    within BATCH_QUEUE_TIMEOUT; retry later) or "llm_error".
+    """
+    def faq_lookup(question, vector) -> Optional[str]:
+        with span("faq_lookup"):
+            return faq_store.get(question, vector=vector)[0]
+
+    try:
+        # The whole batch, not one question: kept apart from /chat's "ask"
+        with span("ask_batch"):
+            for index, raw_answer, error in groq_model.ask_batch(questions, lookup=faq_lookup):
+                if error:
+                    reply, ok = [{"type": "paragraph", "content": raw_answer}], False
+                else:
+                    reply, ok = parse_reply(raw_answer, "/chat/batch")
+                yield json.dumps({"index": index, "question": questions[index], "reply": reply, "ok": ok,
+                                  "error": error}) + "\n"
+    except Exception as e:
+        logger.exception("🔥 Error in /chat/batch endpoint:")
+        yield json.dumps({"error": str(e)}) + "\n"
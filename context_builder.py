@@ -0,0 +1,130 @@
+import os
+import re
+from typing import List, Set, Tuple
+
+from metrics import CONTEXT_TOKENS_SAVED
+
+# --------------- CONFIGURATION --------------- #
+# Upper bound on the context placed in the prompt (approximate tokens)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 900))
+# Word-shingle Jaccard similarity above which a chunk counts as a near-duplicate
+CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", 0.8))
+# Shortest shared span treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 40
+# Longest overlap searched for; the splitter overlaps chunks by CHUNK_OVERLAP (200)
+MAX_OVERLAP_CHARS = 600
+SHINGLE_WORDS = 5
+# A partially fitting chunk is only truncated when this much budget is left
+MIN_PARTIAL_TOKENS = 40
+
+
+def approx_tokens(text: str) -> int:
+    """About 4 characters per token for English text."""
+    return (len(text) + 3) // 4
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def _jaccard(a: Set, b: Set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is also a prefix of `right`."""
+    probe = right[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    start = max(0, len(left) - MAX_OVERLAP_CHARS)
+    idx = left.find(probe, start)
+    while idx != -1:
+        if right.startswith(left[idx:]):
+            return len(left) - idx
+        idx = left.find(probe, idx + 1)
+    return 0
+
+
+def remove_redundancy(texts: List[str]) -> List[str]:
+    """
+    Drop chunks contained in or nearly identical to a higher-ranked chunk,
+    and cut the span a chunk shares with a neighbouring chunk it overlaps.
+    Rank order is preserved.
+    """
+    kept: List[str] = []
+    kept_shingles: List[Set] = []
+    for text in texts:
+        text = text.strip()
+        for other in kept:
+            if not text:
+                break
+            if text in other:
+                text = ""
+                break
+            # Chunk follows `other` in the source: cut the repeated head
+            head = _overlap(other, text)
+            if head:
+                text = text[head:].lstrip()
+            # Chunk precedes `other`: cut the repeated tail
+            tail = _overlap(text, other)
+            if tail:
+                text = text[:-tail].rstrip()
+        if not text:
+            continue
+        shingles = _shingles(text)
+        if any(_jaccard(shingles, other) >= CONTEXT_DUPLICATE_SIMILARITY for other in kept_shingles):
+            continue
+        kept.append(text)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    cut = text[: max_tokens * 4]
+    # Prefer ending on a sentence, then on a word
+    end = max(cut.rfind(". "), cut.rfind(".\n"))
+    if end > len(cut) // 2:
+        return cut[: end + 1]
+    return cut.rsplit(" ", 1)[0]
+
+
+def pack(texts: List[str], budget: int) -> List[str]:
+    """Keep chunks in rank order until `budget` tokens are used."""
+    packed, used = [], 0
+    for text in texts:
+        tokens = approx_tokens(text)
+        if used + tokens <= budget:
+            packed.append(text)
+            used += tokens
+            continue
+        remaining = budget - used
+        if remaining >= MIN_PARTIAL_TOKENS:
+            packed.append(_truncate(text, remaining))
+        break
+    return packed
+
+
+def build_context(docs, budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[str, dict]:
+    """
+    Assemble the prompt context from retrieved documents: de-duplicate,
+    trim overlaps, then pack under the token budget.
+    Returns (context, stats).
+    """
+    texts = [doc.page_content for doc in docs]
+    raw_tokens = approx_tokens("\n\n".join(texts))
+    packed = pack(remove_redundancy(texts), budget)
+    context = "\n\n".join(packed)
+    stats = {
+        "chunks_in": len(texts),
+        "chunks_out": len(packed),
+        "raw_tokens": raw_tokens,
+        "context_tokens": approx_tokens(context),
+    }
+    stats["tokens_saved"] = stats["raw_tokens"] - stats["context_tokens"]
+    CONTEXT_TOKENS_SAVED.inc(max(0, stats["tokens_saved"]))
+    return context, stats
@@ -1,90 +1,340 @@
 
 import os
 import glob
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import fitz  # PyMuPDF
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from embedding_cache import CachedEmbeddings
+from model_registry import get_embeddings
+from index_manifest import (
+    CHROMA_DB_PATH,
+    bump_index_version,
+    diff_manifest,
+    doc_id_for,
+    file_sha256,
+    load_manifest,
+    manifest_path,
+    save_manifest,
+)
+from sharded_index import (
+    SHARD_BY,
+    group_pdfs_by_shard,
+    list_shards,
+    remove_shard,
+    shard_directory,
+    write_shard_centroid,
+)
 
 # --------------- CONFIGURATION --------------- #
 # ✅ Use raw string or forward slashes for paths to avoid escape issues on Windows
-PDF_FOLDER = r"D:\Live projects\AI Chatbot\data"
-CHROMA_DB_PATH = r"./chroma_db"
+PDF_FOLDER = os.getenv("PDF_FOLDER", r"D:\Live projects\AI Chatbot\data")
 EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+# Number of worker processes used to extract and chunk PDFs (1 = sequential)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+# Chunks embedded and written to Chroma per add_texts call
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 256))
 
 
 # --------------- EXTRACT TEXT FROM PDF --------------- #
+Chunk = Tuple[str, Dict]  # (chunk text, {"source": ..., "page": ...})
+
+
+def _read_pdf_text(pdf_path: str) -> str:
+    text_parts = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            text_parts.append(page.get_text("text"))
+    return "\n".join(text_parts)
+
+
 def extract_text_from_pdf(pdf_path: str) -> str:
     """
     Extract plain text from a PDF file using PyMuPDF.
     """
-    text_parts = []
     try:
-        with fitz.open(pdf_path) as doc:
-            for page in doc:
-                text_parts.append(page.get_text("text"))
+        return _read_pdf_text(pdf_path)
     except Exception as e:
         print(f"[ERROR] Failed to read {pdf_path}: {e}")
         return ""
-    return "\n".join(text_parts)
 
 
-def load_pdfs_from_folder(folder: str):
+def extract_and_chunk_pdf(pdf_path: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
     """
-    Return all PDF file paths from a folder.
+    Extract and chunk a single PDF page by page. Runs inside a worker process,
+    so errors are returned instead of printed: (pdf_path, chunks, error).
+
+    Chunks never span pages and carry {"source", "page"} metadata (1-based page).
     """
-    pdf_files = sorted(glob.glob(os.path.join(folder, "*.pdf")))
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks: List[Chunk] = []
+    try:
+        with fitz.open(pdf_path) as doc:
+            for page_number, page in enumerate(doc, start=1):
+                page_text = page.get_text("text")
+                if not page_text.strip():
+                    continue
+                metadata = {"source": pdf_path, "page": page_number}
+                chunks.extend((chunk, dict(metadata)) for chunk in splitter.split_text(page_text))
+    except Exception as e:
+        return pdf_path, [], str(e)
+    return pdf_path, chunks, None
+
+
+def iter_extracted_pdfs(pdf_files, workers: int = INGEST_WORKERS,
+                        chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
+    """
+    Yield (pdf_path, chunks, error) for every PDF, in the order of `pdf_files`.
+
+    With workers > 1 the files are extracted and chunked across a process pool.
+    Only a small window of files is in flight at once so results are yielded
+    in input order without holding the whole corpus in memory.
+    """
+    if workers <= 1 or len(pdf_files) <= 1:
+        for pdf_path in pdf_files:
+            yield extract_and_chunk_pdf(pdf_path, chunk_size, chunk_overlap)
+        return
+
+    remaining = iter(pdf_files)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque(
+            pool.submit(extract_and_chunk_pdf, p, chunk_size, chunk_overlap)
+            for p in islice(remaining, workers * 2)
+        )
+        while pending:
+            result = pending.popleft().result()
+            next_path = next(remaining, None)
+            if next_path is not None:
+                pending.append(pool.submit(extract_and_chunk_pdf, next_path, chunk_size, chunk_overlap))
+            yield result
+
+
+def iter_pdf_chunks(pdf_files, workers: int = INGEST_WORKERS,
+                    chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> Iterator[Chunk]:
+    """
+    Stream (text, metadata) chunks for all PDFs, reporting unreadable files as it goes.
+    """
+    for pdf_path, pdf_chunks, error in iter_extracted_pdfs(pdf_files, workers, chunk_size, chunk_overlap):
+        print(f"   → Extracted from: {os.path.basename(pdf_path)}")
+        if error:
+            print(f"[ERROR] Failed to read {pdf_path}: {error}")
+        if not pdf_chunks:
+            print(f"   ⚠️ Warning: {os.path.basename(pdf_path)} seems empty or unreadable.")
+        yield from pdf_chunks
+
+
+def load_pdfs_from_folder(folder: str, recursive: bool = False):
+    """
+    Return all PDF file paths from a folder (and its sub-folders if `recursive`).
+    """
+    pattern = os.path.join(folder, "**", "*.pdf") if recursive else os.path.join(folder, "*.pdf")
+    pdf_files = sorted(glob.glob(pattern, recursive=recursive))
     if not pdf_files:
         print(f"[WARNING] No PDFs found in folder: {folder}")
     return pdf_files
 
 
 # --------------- CHUNKING + VECTOR DB CREATION --------------- #
-def create_vector_db_from_pdfs():
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Group an iterable into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def clear_collection(vectordb, batch_size: int = EMBED_BATCH_SIZE) -> int:
     """
-    Read PDFs, extract text, create embeddings, and save as a Chroma DB.
+    Delete every vector of the store's collection but keep the collection.
+    Dropping it instead would leave Chroma handles cached by a running server
+    (model_registry) pointing at a collection that no longer exists.
+    Returns the number of vectors deleted.
     """
-    pdf_files = load_pdfs_from_folder(PDF_FOLDER)
-    if not pdf_files:
-        raise FileNotFoundError(f"No PDFs found in folder: {PDF_FOLDER}")
+    deleted = 0
+    while True:
+        ids = vectordb._collection.get(limit=batch_size, include=[])["ids"]
+        if not ids:
+            return deleted
+        vectordb._collection.delete(ids=ids)
+        deleted += len(ids)
 
-    print(f"[INFO] Found {len(pdf_files)} PDF(s). Extracting text...")
-    all_texts = []
-    for pdf_path in pdf_files:
-        print(f"   → Extracting from: {os.path.basename(pdf_path)}")
-        text = extract_text_from_pdf(pdf_path)
-        if text.strip():
-            all_texts.append(text)
-        else:
-            print(f"   ⚠️ Warning: {os.path.basename(pdf_path)} seems empty or unreadable.")
 
-    if not all_texts:
-        raise ValueError("No valid text extracted from PDFs. Please check input files.")
+def chunk_id(prefix: str, page: int, index: int) -> str:
+    """Stable Chroma id for the index-th chunk of a page."""
+    return f"{prefix}:p{page}:c{index}"
+
+
+def add_chunks_to_vectordb(vectordb, chunks: Iterable[Chunk], batch_size: int = EMBED_BATCH_SIZE,
+                           doc_ids: Optional[Dict[str, str]] = None) -> Dict[str, List[str]]:
+    """
+    Embed and write chunks to Chroma one batch at a time. Only a single batch is
+    held in memory, so peak usage does not depend on the corpus size.
 
-    combined_text = "\n\n".join(all_texts)
+    Chunk ids are prefixed with doc_ids[source] when given, else with the source.
+    Returns the ids written, grouped by source.
+    """
+    ids_by_source: Dict[str, List[str]] = {}
+    total = 0
+    page_key, page_index = None, 0
+    for batch in batched(chunks, batch_size):
+        texts, metadatas, ids = [], [], []
+        seen = set()
+        for text, metadata in batch:
+            source, page = metadata["source"], metadata["page"]
+            page_index = page_index + 1 if (source, page) == page_key else 0
+            page_key = (source, page)
+            prefix = doc_ids.get(source, source) if doc_ids else source
+            cid = chunk_id(prefix, page, page_index)
+            if cid in seen:  # Chroma rejects duplicate ids within one call
+                continue
+            seen.add(cid)
+            texts.append(text)
+            metadatas.append(metadata)
+            ids.append(cid)
+            ids_by_source.setdefault(source, []).append(cid)
+        vectordb.add_texts(texts, metadatas=metadatas, ids=ids)
+        total += len(texts)
+        print(f"   → Embedded {total} chunks...")
+    return ids_by_source
+
+
+def sync_pdfs_to_vectordb(pdf_files: List[str], persist_directory: str = CHROMA_DB_PATH,
+                          embedding_model: str = EMBED_MODEL, workers: int = INGEST_WORKERS,
+                          chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                          rebuild: bool = False):
+    """
+    Incrementally bring the Chroma DB in line with `pdf_files`.
 
-    print("[INFO] Splitting text into chunks...")
-    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
-    chunks = splitter.split_text(combined_text)
-    print(f"[INFO] Created {len(chunks)} chunks.")
+    Uses the ingest manifest (file hash -> chunk ids) to embed only new or
+    changed PDFs and to delete the vectors of changed or removed ones. Returns
+    the opened Chroma DB, or None when nothing changed (no model is loaded then).
+    """
+    params = {"embed_model": embedding_model, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+    manifest = {"params": {}, "files": {}} if rebuild else load_manifest(persist_directory)
+    file_hashes = {p: file_sha256(p) for p in pdf_files}
+    to_ingest, to_remove = diff_manifest(manifest, file_hashes, params)
+    if not to_ingest and not to_remove:
+        print(f"[INFO] Chroma DB is up to date ({len(pdf_files)} PDF(s) unchanged). Nothing to ingest.")
+        return None
+
+    # Unchanged chunk texts are served from the on-disk embedding cache
+    embeddings = CachedEmbeddings(get_embeddings(embedding_model), embedding_model)
+    vectordb = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
 
-    print("[INFO] Creating embeddings and saving Chroma database...")
-    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
+    if not manifest["files"] and vectordb._collection.count() > 0:
+        # Legacy store (or --rebuild): no record of which ids belong to which file
+        print("[INFO] Existing Chroma DB has no ingest manifest. Rebuilding it from scratch...")
+        print(f"[INFO] Deleted {clear_collection(vectordb)} existing chunks.")
 
-    # Initialize Chroma DB; if directory exists, it will load it
-    vectordb = Chroma(persist_directory=CHROMA_DB_PATH, embedding_function=embeddings)
+    stale_ids = [cid for p in to_remove for cid in manifest["files"][p]["chunk_ids"]]
+    for id_batch in batched(stale_ids, EMBED_BATCH_SIZE):
+        vectordb.delete(ids=id_batch)
+    for p in to_remove:
+        manifest["files"].pop(p)
+    print(f"[INFO] {len(to_ingest)} new/changed PDF(s), {len(to_remove)} removed/changed "
+          f"({len(stale_ids)} stale chunks deleted).")
 
-    # Add texts only if DB is empty to avoid duplication
-    if len(vectordb._collection.get()['ids']) == 0:  # Check existing IDs
-        ids = [str(i) for i in range(len(chunks))]
-        vectordb.add_texts(chunks, ids=ids)
-        vectordb.persist()
-        print(f"[SUCCESS] Chroma DB successfully saved at: {os.path.abspath(CHROMA_DB_PATH)}")
-    else:
-        print(f"[INFO] Chroma DB already contains data. Skipping adding texts.")
+    doc_ids = {p: doc_id_for(p, file_hashes[p]) for p in to_ingest}
+    chunks = iter_pdf_chunks(to_ingest, workers, chunk_size, chunk_overlap)
+    ids_by_source = add_chunks_to_vectordb(vectordb, chunks, doc_ids=doc_ids)
+    for p in to_ingest:
+        # Unreadable files are recorded too: they are retried once their content changes
+        manifest["files"][p] = {"sha256": file_hashes[p], "chunk_ids": ids_by_source.get(p, [])}
+    manifest["params"] = params
+
+    vectordb.persist()
+    save_manifest(persist_directory, manifest)
+    bump_index_version(persist_directory)
+    added = sum(len(ids) for ids in ids_by_source.values())
+    print(f"[INFO] Added {added} chunks from {len(ids_by_source)} PDF(s) "
+          f"({embeddings.cache.hits} embeddings reused from cache, {embeddings.cache.misses} computed).")
+    return vectordb
+
+
+def sync_sharded_pdfs(pdf_files: List[str], pdf_root: str, persist_directory: str = CHROMA_DB_PATH,
+                      shard_by: str = SHARD_BY, embedding_model: str = EMBED_MODEL, workers: int = INGEST_WORKERS,
+                      chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                      rebuild: bool = False) -> List[str]:
+    """
+    Sync each shard of a sharded store with its share of `pdf_files` (see
+    sharded_index.py). Shards whose PDFs did not change cost only a hash
+    check; shards with no PDFs left are emptied and retired. Returns the changed shards.
+    """
+    if os.path.exists(manifest_path(persist_directory)):
+        print(f"[WARNING] {persist_directory} also holds an unsharded store; it is not searched once shards exist.")
+    groups = group_pdfs_by_shard(pdf_files, pdf_root, shard_by)
+    changed = []
+    for name, files in sorted(groups.items()):
+        print(f"[INFO] Shard '{name}': {len(files)} PDF(s)")
+        shard_dir = shard_directory(name, persist_directory)
+        vectordb = sync_pdfs_to_vectordb(files, shard_dir, embedding_model, workers, chunk_size, chunk_overlap, rebuild)
+        if vectordb is not None:
+            write_shard_centroid(vectordb, shard_dir)
+            changed.append(name)
+    for name in list_shards(persist_directory):
+        if name not in groups:
+            vectordb = Chroma(persist_directory=shard_directory(name, persist_directory))
+            clear_collection(vectordb)
+            vectordb.persist()
+            remove_shard(name, persist_directory)
+            changed.append(name)
+    if changed:
+        # Caches and retrievers built on the whole store watch the root version
+        bump_index_version(persist_directory)
+    return changed
+
+
+def create_vector_db_from_pdfs(workers: int = INGEST_WORKERS, rebuild: bool = False, shard_by: str = SHARD_BY):
+    """
+    Read PDFs, extract text, create embeddings, and save as a Chroma DB.
+    Only new or changed PDFs are embedded unless `rebuild` is set.
+    With shard_by "folder" or "category" each document family gets its own shard.
+    """
+    sharded = shard_by != "none"
+    pdf_files = load_pdfs_from_folder(PDF_FOLDER, recursive=sharded)
+    if not pdf_files:
+        raise FileNotFoundError(f"No PDFs found in folder: {PDF_FOLDER}")
+
+    if sharded:
+        print(f"[INFO] Found {len(pdf_files)} PDF(s). Syncing shards (by {shard_by}) with {workers} worker(s)...")
+        changed = sync_sharded_pdfs(pdf_files, PDF_FOLDER, shard_by=shard_by, workers=workers, rebuild=rebuild)
+        if changed:
+            print(f"[SUCCESS] Updated shard(s) {', '.join(changed)} under: {os.path.abspath(CHROMA_DB_PATH)}")
+        return
+
+    if list_shards(CHROMA_DB_PATH):
+        print(f"[WARNING] {CHROMA_DB_PATH} holds shards, which are searched instead of this unsharded store.")
+    print(f"[INFO] Found {len(pdf_files)} PDF(s). Syncing Chroma DB with {workers} worker(s)...")
+    vectordb = sync_pdfs_to_vectordb(pdf_files, workers=workers, rebuild=rebuild)
+    if vectordb is None:
+        return
+    if vectordb._collection.count() == 0:
+        raise ValueError("No valid text extracted from PDFs. Please check input files.")
+
+    print(f"[SUCCESS] Chroma DB successfully saved at: {os.path.abspath(CHROMA_DB_PATH)}")
 
 
 if __name__ == "__main__":
-    create_vector_db_from_pdfs()
+    parser = argparse.ArgumentParser(description="Build the Chroma DB from a folder of PDFs.")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="Worker processes for PDF extraction (1 = sequential)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Ignore the ingest manifest and re-embed every PDF")
+    parser.add_argument("--refresh-faq", action="store_true",
+                        help="Regenerate the precomputed FAQ answers if the index changed")
+    parser.add_argument("--shard-by", choices=["none", "folder", "category"], default=SHARD_BY,
+                        help="Split the store into shards by sub-folder or by SHARD_CATEGORIES_PATH patterns")
+    args = parser.parse_args()
+    create_vector_db_from_pdfs(workers=args.workers, rebuild=args.rebuild, shard_by=args.shard_by)
+    if args.refresh_faq:
+        from faq_answers import build_faq_answers, faq_answers_stale
+        from groq_rag_model import GroqRAGModel
+
+        if faq_answers_stale(persist_directory=CHROMA_DB_PATH):
+            build_faq_answers(GroqRAGModel(persist_directory=CHROMA_DB_PATH, use_answer_cache=False))
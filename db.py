@@ -2,6 +2,11 @@ import mysql.connector
 from mysql.connector import Error
 from dotenv import load_dotenv
 import os
+import time
+import queue
+import threading
+
+from metrics import DB_ERRORS, span
 
 # Load environment variables from .env
 load_dotenv()
@@ -12,26 +17,185 @@ MYSQL_USER = os.getenv("MYSQL_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")       
 MYSQL_DB = os.getenv("MYSQL_DB")
 
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", 10))
+MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", 5))       # seconds to wait for a free connection
+MYSQL_POOL_RECYCLE = float(os.getenv("MYSQL_POOL_RECYCLE", 3600))    # seconds before a connection is replaced
+
+
+def _connect():
+    """Open a new MySQL connection using TCP/IP"""
+    return mysql.connector.connect(
+        host=MYSQL_HOST,
+        port=MYSQL_PORT,
+        user=MYSQL_USER,
+        password=MYSQL_PASSWORD,
+        database=MYSQL_DB,
+        charset='utf8mb4'
+    )
+
+
+class PooledConnection:
+    """
+    Wraps a pooled MySQL connection. Everything is delegated to the real
+    connection except close(), which hands it back to the pool.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._release(raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        # Safety net for callers that bail out before close()
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe MySQL connection pool.
+
+    At most `size` connections are checked out at once; callers wait up to
+    `timeout` seconds for one to free up. Idle connections are pinged on
+    checkout (reconnecting if the server dropped them) and replaced once they
+    are older than `recycle` seconds.
+    """
+
+    def __init__(self, size: int = MYSQL_POOL_SIZE, timeout: float = MYSQL_POOL_TIMEOUT,
+                 recycle: float = MYSQL_POOL_RECYCLE):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._stats = {"checkouts": 0, "created": 0, "reconnects": 0, "recycled": 0,
+                       "timeouts": 0, "errors": 0, "in_use": 0}
+
+    def _count(self, name, delta=1):
+        with self._lock:
+            self._stats[name] += delta
+
+    def _reset_after_fork(self):
+        # Sockets inherited from the parent process must not be shared
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle = queue.LifoQueue()
+            self._slots = threading.BoundedSemaphore(self.size)
+            self._stats["in_use"] = 0
+
+    def get_connection(self) -> PooledConnection:
+        self._reset_after_fork()
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count("timeouts")
+            raise Error(msg=f"Connection pool exhausted ({self.size} in use)")
+        try:
+            raw, created_at = self._checkout_idle()
+            if raw is None:
+                raw, created_at = _connect(), time.monotonic()
+                self._count("created")
+        except Exception:
+            self._slots.release()
+            self._count("errors")
+            raise
+        self._count("checkouts")
+        self._count("in_use")
+        return PooledConnection(self, raw, created_at)
+
+    def _checkout_idle(self):
+        """Return a healthy idle connection, or (None, None) if there is none."""
+        while True:
+            try:
+                raw, created_at = self._idle.get_nowait()
+            except queue.Empty:
+                return None, None
+            if time.monotonic() - created_at > self.recycle:
+                self._close_quietly(raw)
+                self._count("recycled")
+                continue
+            try:
+                if not raw.is_connected():
+                    raw.reconnect(attempts=1, delay=0)
+                    self._count("reconnects")
+                return raw, created_at
+            except Error:
+                self._close_quietly(raw)
+                self._count("errors")
+
+    def _release(self, raw, created_at):
+        if os.getpid() != self._pid:
+            return
+        self._count("in_use", -1)
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+            self._idle.put((raw, created_at))
+        except Error:
+            self._close_quietly(raw)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": self.size, "idle": self._idle.qsize(), **self._stats}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
 def get_connection():
-    """Create and return a MySQL database connection using TCP/IP"""
+    """
+    Return a pooled MySQL connection (None if the database is unreachable).
+    Calling close() on it returns it to the pool.
+    """
     try:
-        connection = mysql.connector.connect(
-            host=MYSQL_HOST,
-            port=MYSQL_PORT,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DB,
-            charset='utf8mb4'
-        )
-        if connection.is_connected():
-            print("Connected to MySQL database")
-            return connection
+        with span("db_connect"):
+            return get_pool().get_connection()
     except Error as e:
+        DB_ERRORS.inc(operation="connect")
         print(f"Error connecting to MySQL: {e}")
         return None
 
+
+def pool_stats() -> dict:
+    """Usage counters of the connection pool"""
+    return get_pool().stats()
+
 # Test connection
 if __name__ == "__main__":
     conn = get_connection()
     if conn:
+        print("Connected to MySQL database")
         conn.close()
+        print(pool_stats())
@@ -0,0 +1,174 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# --------------- CONFIGURATION --------------- #
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "./embedding_cache")
+# ~300 MB of float32 vectors for 384-dim MiniLM embeddings
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", 200_000))
+INITIAL_CAPACITY = 1024
+
+
+def text_key(model_name: str, text: str) -> str:
+    """Cache key: the model name plus the chunk text, hashed."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed embedding store for one model.
+
+    Vectors live in a memory-mapped float32 matrix (vectors.f32); a small SQLite
+    index maps each key to its row and last-use time. Once `max_entries` is
+    reached, the least recently used rows are evicted and their slots reused,
+    so the matrix never grows past max_entries rows.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = EMBED_CACHE_DIR,
+                 max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._lock = threading.Lock()
+        # Shared by every process using the cache directory (server workers, ingestion)
+        self._db = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), timeout=30,
+                                   check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, row INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.commit()
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim = row[0] if row else None
+        self._matrix = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    # ---------------- STORAGE ---------------- #
+    def _open_matrix(self, min_rows: int):
+        """Map the vector file, growing it (doubling, capped at max_entries) to hold min_rows."""
+        if self._matrix is not None and self._matrix.shape[0] >= min_rows:
+            return self._matrix
+        rows = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        if rows < min_rows:
+            rows = min(max(min_rows, rows * 2, INITIAL_CAPACITY), self.max_entries)
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(rows * self.dim * 4)
+        self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+        return self._matrix
+
+    def _lookup_rows(self, keys: List[str]) -> Dict[str, int]:
+        rows = {}
+        for start in range(0, len(keys), 500):  # stay under SQLite's variable limit
+            part = keys[start:start + 500]
+            rows.update(self._db.execute(
+                f"SELECT key, row FROM entries WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall())
+        return rows
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for the keys that are present, marking them as used."""
+        if not keys or self.dim is None:
+            self.misses += len(keys)
+            return {}
+        with self._lock:
+            found = self._lookup_rows(keys)
+            if not found:
+                self.misses += len(keys)
+                return {}
+            matrix = self._open_matrix(max(found.values()) + 1)
+            now = time.time()
+            self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+            self._db.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            return {k: np.array(matrix[row]) for k, row in found.items()}
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Store vectors, evicting least recently used entries when the cache is full."""
+        if not items:
+            return
+        with self._lock:
+            # Row allocation, vector writes and the index update happen under
+            # SQLite's write lock, so two processes never claim the same row
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._put_locked(items)
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def _put_locked(self, items: Dict[str, List[float]]):
+        if self.dim is None:
+            row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+            self.dim = row[0] if row else len(next(iter(items.values())))
+            self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)", (self.dim,))
+        # Content-addressed: a key that is already stored holds the same vector
+        existing = self._lookup_rows(list(items))
+        new_keys = [k for k in items if k not in existing][: self.max_entries]
+        if not new_keys:
+            return
+        count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+        free = max(0, self.max_entries - count)
+        rows = list(range(count, count + min(free, len(new_keys))))
+        overflow = len(new_keys) - len(rows)
+        if overflow > 0:
+            evicted = self._db.execute(
+                "SELECT key, row FROM entries ORDER BY last_used LIMIT ?", (overflow,)
+            ).fetchall()
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in evicted])
+            rows.extend(row for _, row in evicted)
+
+        assignments = dict(zip(new_keys, rows))
+        matrix = self._open_matrix(max(assignments.values()) + 1)
+        now = time.time()
+        for key, row in assignments.items():
+            matrix[row] = np.asarray(items[key], dtype=np.float32)
+        matrix.flush()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO entries (key, row, last_used) VALUES (?, ?, ?)",
+            [(key, row, now) for key, row in assignments.items()],
+        )
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model so document embeddings are looked up in an
+    EmbeddingCache first and only unseen chunk texts are sent to the model.
+    Query embeddings are passed straight through.
+    """
+
+    def __init__(self, base: Embeddings, model_name: str, cache: EmbeddingCache = None):
+        self.base = base
+        self.model_name = model_name
+        self.cache = cache if cache is not None else EmbeddingCache(model_name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(self.model_name, t) for t in texts]
+        cached = self.cache.get_many(list(dict.fromkeys(keys)))
+        missing = list(dict.fromkeys(k for k in keys if k not in cached))
+        if missing:
+            text_by_key = dict(zip(keys, texts))
+            computed = self.base.embed_documents([text_by_key[k] for k in missing])
+            fresh = dict(zip(missing, computed))
+            self.cache.put_many(fresh)
+            cached.update({k: np.asarray(v, dtype=np.float32) for k, v in fresh.items()})
+        return [cached[k].tolist() for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
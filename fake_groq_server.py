@@ -0,0 +1,140 @@
+"""
+Local stand-in for Groq's OpenAI-compatible chat completions endpoint, for
+load-testing the LLM scheduler without spending quota.
+
+It answers POST /openai/v1/chat/completions after a fixed latency with a
+small valid JSON answer, and returns 429 (with retry-after) once more than
+--rpm requests or --tpm tokens arrive within a sliding minute, like the real
+API. Streaming requests get the same answer as server-sent events.
+
+Run:       python fake_groq_server.py --port 8008 --rpm 30
+Then:      GROQ_API_BASE=http://127.0.0.1:8008 python app.py
+"""
+import json
+import time
+import uuid
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = json.dumps([
+    {"type": "header", "content": "Fake Groq Answer"},
+    {"type": "section", "title": "Schemes", "items": [
+        {"scheme": "Test Scheme", "description": "Returned by fake_groq_server.py."}
+    ]},
+])
+
+
+class RateWindow:
+    """Requests and tokens accepted during the last 60 seconds."""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.events = deque()  # (timestamp, tokens)
+        self.tokens = 0
+        self.lock = threading.Lock()
+        self.stats = {"accepted": 0, "rate_limited": 0}
+
+    def admit(self, tokens: int):
+        """Record the request and return None, or return the seconds until it would fit."""
+        with self.lock:
+            now = time.monotonic()
+            while self.events and now - self.events[0][0] >= 60:
+                self.tokens -= self.events.popleft()[1]
+            over_requests = self.rpm and len(self.events) >= self.rpm
+            over_tokens = self.tpm and self.tokens + tokens > self.tpm
+            if over_requests or over_tokens:
+                self.stats["rate_limited"] += 1
+                return max(0.1, 60 - (now - self.events[0][0])) if self.events else 1.0
+            self.events.append((now, tokens))
+            self.tokens += tokens
+            self.stats["accepted"] += 1
+            return None
+
+
+def make_handler(window: RateWindow, latency: float):
+    class FakeGroqHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._send_json(200, window.stats)
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "Not found"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = "".join(str(m.get("content", "")) for m in request.get("messages", []))
+            prompt_tokens = len(prompt) // 4
+            completion_tokens = len(ANSWER) // 4
+
+            retry_after = window.admit(prompt_tokens + completion_tokens)
+            if retry_after is not None:
+                self._send_json(429, {"error": {
+                    "message": "Rate limit reached. Please try again later.",
+                    "type": "requests", "code": "rate_limit_exceeded",
+                }}, headers={"retry-after": f"{retry_after:.2f}"})
+                return
+
+            time.sleep(latency)
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            model = request.get("model", "fake")
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens}
+            if request.get("stream"):
+                self._stream(completion_id, model)
+                return
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": ANSWER}}],
+                "usage": usage,
+            })
+
+        def _stream(self, completion_id: str, model: str):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            pieces = [ANSWER[i:i + 16] for i in range(0, len(ANSWER), 16)]
+            for i, piece in enumerate(pieces):
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece},
+                                 "finish_reason": "stop" if i == len(pieces) - 1 else None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+    return FakeGroqHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Groq chat completions server with rate limits.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--rpm", type=int, default=30, help="Requests per minute before 429 (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens per minute before 429 (0 = unlimited)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per completion")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(RateWindow(args.rpm, args.tpm), args.latency))
+    print(f"[READY] Fake Groq server on http://{args.host}:{args.port} (rpm={args.rpm}, tpm={args.tpm})")
+    server.serve_forever()
@@ -0,0 +1,252 @@
+"""
+Precomputed answers for the questions users ask most.
+
+Offline job (python faq_answers.py): reads the user messages in chat_history,
+clusters them by embedding, answers the largest clusters through
+GroqRAGModel against the current index and writes the validated answers to
+FAQ_ANSWERS_PATH together with the index version they were built from.
+
+Serving (FAQStore): /chat looks a question up here before calling the LLM.
+A question matches when its normalized text is a known variant of a cluster
+or its embedding is close enough to a cluster centroid. Answers built from
+an older index version are never served; run the job again (or ingest with
+create_vector_db.py --refresh-faq) after the corpus changes.
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from answer_cache import normalize_query, unit_vector
+from index_manifest import CHROMA_DB_PATH, read_index_version
+from metrics import CACHE_LOOKUPS
+
+# --------------- CONFIGURATION --------------- #
+FAQ_ANSWERS_PATH = os.getenv("FAQ_ANSWERS_PATH", "./faq_answers.json")
+FAQ_TOP_N = int(os.getenv("FAQ_TOP_N", 100))
+FAQ_MIN_CLUSTER_SIZE = int(os.getenv("FAQ_MIN_CLUSTER_SIZE", 3))
+# Cosine similarity for joining a cluster (offline) and for matching one (serving)
+FAQ_CLUSTER_SIMILARITY = float(os.getenv("FAQ_CLUSTER_SIMILARITY", 0.9))
+FAQ_MATCH_SIMILARITY = float(os.getenv("FAQ_MATCH_SIMILARITY", 0.92))
+FAQ_EMBED_BATCH_SIZE = 256
+# How often (seconds) the store re-checks the index version and the answers file
+FAQ_CHECK_INTERVAL = 5.0
+
+
+# --------------- OFFLINE JOB --------------- #
+def load_user_questions() -> Counter:
+    """Count chat_history user messages by normalized text."""
+    from db import get_connection
+
+    conn = get_connection()
+    if conn is None:
+        raise RuntimeError("Could not connect to MySQL to read chat_history.")
+    counts: Counter = Counter()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT message FROM chat_history WHERE sender = 'user'")
+        for (message,) in cursor:
+            key = normalize_query(message or "")
+            if key:
+                counts[key] += 1
+        cursor.close()
+    finally:
+        conn.close()
+    print(f"[INFO] Read {sum(counts.values())} user messages ({len(counts)} distinct).")
+    return counts
+
+
+def cluster_questions(counts: Counter, embed_documents: Callable,
+                      threshold: float = FAQ_CLUSTER_SIMILARITY) -> List[dict]:
+    """
+    Greedy leader clustering: distinct questions are visited from most to
+    least frequent; each joins the first cluster whose leader it matches
+    above `threshold`, otherwise it leads a new cluster.
+    Returns clusters sorted by total message count.
+    """
+    questions = [q for q, _ in counts.most_common()]
+    if not questions:
+        return []
+    vectors = []
+    for start in range(0, len(questions), FAQ_EMBED_BATCH_SIZE):
+        vectors.extend(embed_documents(questions[start:start + FAQ_EMBED_BATCH_SIZE]))
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1, norms)
+
+    clusters: List[dict] = []
+    # Row i is the leader of clusters[i]; at most one cluster per question
+    leaders = np.empty_like(vectors)
+    for question, vector in zip(questions, vectors):
+        if len(clusters):
+            scores = leaders[:len(clusters)] @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                cluster = clusters[best]
+                cluster["variants"].append(question)
+                cluster["count"] += counts[question]
+                cluster["vector_sum"] += vector * counts[question]
+                continue
+        clusters.append({
+            "question": question,
+            "variants": [question],
+            "count": counts[question],
+            "vector_sum": vector * counts[question],
+        })
+        leaders[len(clusters) - 1] = vector
+
+    for cluster in clusters:
+        cluster["centroid"] = unit_vector(cluster.pop("vector_sum")).tolist()
+    clusters.sort(key=lambda c: c["count"], reverse=True)
+    return clusters
+
+
+def is_valid_answer(answer) -> bool:
+    """An answer worth precomputing: JSON list of blocks the frontend renders."""
+    from groq_rag_model import parse_answer_json
+
+    parsed, ok = parse_answer_json(answer)
+    return ok and isinstance(parsed, list) and bool(parsed) and all(
+        isinstance(block, dict) and "type" in block for block in parsed
+    )
+
+
+def faq_answers_stale(path: str = FAQ_ANSWERS_PATH, persist_directory: str = CHROMA_DB_PATH) -> bool:
+    """True when `path` is missing or was built from another index version."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("index_version") != read_index_version(persist_directory)
+    except (OSError, ValueError):
+        return True
+
+
+def build_faq_answers(model, path: str = FAQ_ANSWERS_PATH, top_n: int = FAQ_TOP_N,
+                      min_cluster_size: int = FAQ_MIN_CLUSTER_SIZE) -> int:
+    """Cluster chat_history, answer the top clusters with `model` and write `path`. Returns the entry count."""
+    version = read_index_version(model.persist_directory)
+    counts = load_user_questions()
+    clusters = [c for c in cluster_questions(counts, model.embeddings.embed_documents)
+                if c["count"] >= min_cluster_size][:top_n]
+    print(f"[INFO] Answering {len(clusters)} question clusters...")
+
+    entries = []
+    for cluster in clusters:
+        try:
+            answer = model.ask(cluster["question"])
+        except Exception as e:
+            print(f"[WARNING] Skipping cluster '{cluster['question']}': {e}")
+            continue
+        if not is_valid_answer(answer):
+            print(f"[WARNING] Skipping cluster '{cluster['question']}': answer is not valid JSON.")
+            continue
+        entries.append({**cluster, "answer": answer})
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"index_version": version, "created": time.time(), "entries": entries}, f)
+    os.replace(tmp_path, path)
+    print(f"[SUCCESS] Wrote {len(entries)} precomputed answers to {path}")
+    return len(entries)
+
+
+# --------------- SERVING --------------- #
+class FAQStore:
+    """
+    In-memory lookup over the answers file: a dict of normalized variants for
+    exact hits and a centroid matrix for paraphrases. The file is reloaded
+    when it changes, and nothing is served while its index version differs
+    from the live one.
+    """
+
+    def __init__(self, path: str = FAQ_ANSWERS_PATH, persist_directory: str = CHROMA_DB_PATH,
+                 similarity_threshold: float = FAQ_MATCH_SIMILARITY):
+        self.path = path
+        self.persist_directory = persist_directory
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._current = False
+        self._exact: Dict[str, str] = {}
+        self._answers: List[str] = []
+        self._version = None
+        self._centroids: Optional[np.ndarray] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < FAQ_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self._exact, self._answers, self._centroids, self._mtime = {}, [], None, None
+            self._current = False
+            return
+        if mtime != self._mtime:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entries = data.get("entries", [])
+            self._exact = {variant: entry["answer"] for entry in entries for variant in entry["variants"]}
+            self._answers = [entry["answer"] for entry in entries]
+            self._centroids = np.asarray([entry["centroid"] for entry in entries], dtype=np.float32) if entries else None
+            self._version = data.get("index_version", "")
+            self._mtime = mtime
+            print(f"[INFO] Loaded {len(entries)} precomputed answers.")
+        self._current = self._version == read_index_version(self.persist_directory)
+
+    def get(self, query: str, embed_fn: Optional[Callable] = None,
+            vector=None) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        Return (precomputed answer or None, query vector). Pass `vector` if
+        the question is already embedded; otherwise `embed_fn` is called
+        only when needed, and the vector it produced (or None) is returned
+        so the caller does not embed the question again.
+        """
+        with self._lock:
+            self._refresh()
+            if not self._current or not self._answers:
+                return None, vector
+            answer = self._exact.get(normalize_query(query))
+            centroids = self._centroids
+        if answer is None and centroids is not None and (vector is not None or embed_fn is not None):
+            if vector is None:
+                vector = embed_fn(query)
+            scores = centroids @ unit_vector(vector)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                answer = self._answers[best]
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        CACHE_LOOKUPS.inc(cache="faq", result="miss" if answer is None else "hit")
+        return answer, vector
+
+    def stats(self) -> dict:
+        return {"entries": len(self._answers), "current": self._current, "hits": self.hits, "misses": self.misses}
+
+
+if __name__ == "__main__":
+    from groq_rag_model import GroqRAGModel
+
+    parser = argparse.ArgumentParser(description="Precompute answers for frequent questions in chat_history.")
+    parser.add_argument("--top", type=int, default=FAQ_TOP_N, help="Number of question clusters to answer")
+    parser.add_argument("--min-count", type=int, default=FAQ_MIN_CLUSTER_SIZE)
+    parser.add_argument("--out", default=FAQ_ANSWERS_PATH)
+    parser.add_argument("--if-stale", action="store_true",
+                        help="Only rebuild when the answers were built from another index version")
+    args = parser.parse_args()
+
+    if args.if_stale and not faq_answers_stale(args.out):
+        print("[INFO] Precomputed answers are current. Nothing to do.")
+    else:
+        build_faq_answers(GroqRAGModel(use_answer_cache=False), args.out, top_n=args.top,
+                          min_cluster_size=args.min_count)
@@ -1,25 +1,69 @@
 
 import os
+import json
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 # LangChain Imports
-from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.documents import Document
 from langchain_groq import ChatGroq
 
+from answer_cache import AnswerCache, normalize_query
+from context_builder import CONTEXT_TOKEN_BUDGET, build_context
+from index_manifest import CHROMA_DB_PATH, read_index_version
+from llm_scheduler import LLMBusyError, estimate_tokens, get_llm_scheduler
+from metrics import CACHE_LOOKUPS, span
+from model_registry import get_query_embedder, get_vectorstore, reset_vectorstores
+from numpy_index import NUMPY_INDEX_DIR, NumpyRetriever, load_or_export_index
+from sharded_index import ShardedRetriever, list_shards
+from singleflight import AsyncSingleFlight, SingleFlight
+
+# Questions of one ask_batch() call answered at the same time. Every call still
+# goes through the LLM scheduler, so this only bounds one batch's share of it.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+# Seconds a batch question may wait for LLM admission. Much longer than the
+# interactive LLM_QUEUE_TIMEOUT: a batch has no user waiting on one answer,
+# so it queues behind the rate limit instead of failing.
+BATCH_QUEUE_TIMEOUT = float(os.getenv("BATCH_QUEUE_TIMEOUT", 600))
+
+ERROR_ANSWER = "Error: Could not get answer at this time."
+
+
+class LLMCallError(RuntimeError):
+    """The LLM call was admitted but failed (after the scheduler's 429 retries)."""
+
+
+def parse_answer_json(answer):
+    """
+    Parse the model's answer into a Python object.
+    Returns (parsed, ok); `parsed` is the original value when it is not valid JSON.
+    """
+    if not isinstance(answer, str):
+        return answer, answer is not None
+    try:
+        return json.loads(answer), True
+    except json.JSONDecodeError:
+        return answer, False
+
 
 class GroqRAGModel:
     def __init__(
         self,
         groq_api_key: str = None,
         model_name: str = "groq/compound",  # Using a standard Groq model
-        persist_directory: str = "./chroma_db",
+        persist_directory: str = CHROMA_DB_PATH,
         embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+        use_answer_cache: bool = True,
+        retriever_backend: str = os.getenv("RETRIEVER_BACKEND", "chroma"),
+        search_type: str = os.getenv("RETRIEVER_SEARCH_TYPE", "similarity"),  # or "mmr"
+        context_token_budget: int = CONTEXT_TOKEN_BUDGET,
     ):
         """
         Initialize the RAG model using a prebuilt Chroma DB and Groq LLM.
@@ -33,12 +77,32 @@ class GroqRAGModel:
         self.model_name = model_name
         self.persist_directory = persist_directory
         self.embedding_model = embedding_model
+        self.retriever_backend = retriever_backend
+        self.search_type = search_type
+        self.context_token_budget = context_token_budget
+        self.embeddings = None
         self.vectordb = None
-        self.qa_chain = None
+        self.sharded = False
+        self.llm = None
+        self.retriever = None
+        self.retriever_k = 3
+        self.prompt = None
+        self.stream_llm = None
+        # Every Groq call is admitted through the process-wide rate limiter
+        self.scheduler = get_llm_scheduler()
+        self.answer_cache = None
+        # Identical questions in flight at the same time share one LLM call
+        self.inflight = SingleFlight()
+        self.ainflight = AsyncSingleFlight()
 
         # Initialize pipeline
         self.load_vector_db()
         self.create_qa_chain()
+        if use_answer_cache:
+            self.answer_cache = AnswerCache(
+                embed_fn=self.embeddings.embed_query,
+                version_fn=lambda: read_index_version(self.persist_directory),
+            )
 
     def load_vector_db(self):
         """Load existing Chroma vector database from disk."""
@@ -48,78 +112,340 @@ class GroqRAGModel:
             )
 
         print("[INFO] Loading existing Chroma DB...")
-        embeddings = HuggingFaceEmbeddings(model_name=self.embedding_model)
-        self.vectordb = Chroma(
-            persist_directory=self.persist_directory,
-            embedding_function=embeddings,
-        )
+        # Shared with every other user of the same model/store in this process;
+        # questions from concurrent requests are embedded together in one batch
+        self.embeddings = get_query_embedder(self.embedding_model)
+        # A store ingested with --shard-by is searched shard by shard (sharded_index.py)
+        self.sharded = bool(list_shards(self.persist_directory))
+        if self.sharded:
+            print("[SUCCESS] Sharded vector DB found; shards are opened by the retriever.")
+            return
+        self.vectordb = get_vectorstore(self.persist_directory, self.embedding_model)
         print("[SUCCESS] Vector DB loaded successfully.")
 
+    def build_retriever(self, k: int = 3):
+        """
+        Return the retriever for the configured backend: Chroma itself, or
+        ("numpy") a memory-mapped export of the collection searched in-process.
+        With search_type="mmr" the k results are picked from the 4*k nearest
+        for diversity, so overlapping chunks do not crowd out other sources.
+        A sharded store always uses ShardedRetriever (similarity search).
+        """
+        self.retriever_k = k
+        if self.sharded:
+            return ShardedRetriever(persist_directory=self.persist_directory, embedding_model=self.embedding_model,
+                                    embeddings=self.embeddings, k=k)
+        if self.retriever_backend == "numpy":
+            index = load_or_export_index(self.vectordb, self.persist_directory, NUMPY_INDEX_DIR)
+            return NumpyRetriever(index=index, embeddings=self.embeddings, k=k, search_type=self.search_type,
+                                  vectordb=self.vectordb, persist_directory=self.persist_directory,
+                                  index_dir=NUMPY_INDEX_DIR)
+        if self.search_type == "mmr":
+            return self.vectordb.as_retriever(search_type="mmr", search_kwargs={"k": k, "fetch_k": 4 * k})
+        return self.vectordb.as_retriever(search_kwargs={"k": k})
+
     def create_qa_chain(self):
-        """Create a RetrievalQA pipeline using Groq LLM with a custom JSON prompt."""
-        if not self.vectordb:
+        """Create the retriever, the custom JSON prompt and the Groq LLMs that ask() chains together."""
+        if not self.vectordb and not self.sharded:
             raise ValueError("Vector DB not loaded. Load it before creating QA chain.")
 
-        retriever = self.vectordb.as_retriever(search_kwargs={"k": 3})
+        retriever = self.build_retriever(k=3)
         
-        # This is the key change: A custom prompt template
-        prompt_template = """Use the following pieces of context to answer the user's question.
-        You absolutely must respond in a valid JSON format. Do not include any text, reasoning, or preamble outside of the JSON structure.
-
-        The JSON object must follow this structure:
-        [
-            {{"type": "header", "content": "Main Title Related to the Question"}},
-            {{
-                "type": "section", 
-                "title": "Category Title (e.g., Credit & Financing)", 
-                "items": [
-                    {{"scheme": "Name of the Scheme", "description": "A brief description of the scheme based on the context."}}
-                ]
-            }}
-        ]
+        # Custom prompt template. It is sent with every call, so it is kept
+        # compact: no indentation, one-line JSON schema.
+        prompt_template = """Answer the question using the context. Respond with valid JSON only, no text outside it, in this structure:
+[{{"type":"header","content":"Main title related to the question"}},{{"type":"section","title":"Category title (e.g. Credit & Financing)","items":[{{"scheme":"Scheme name","description":"Brief description based on the context"}}]}}]
 
-        Context: {context}
+Context:
+{context}
 
-        Question: {question}
-
-        Helpful Answer (in valid JSON format):
-        """
+Question: {question}
+JSON answer:"""
         
         PROMPT = PromptTemplate(
             template=prompt_template, input_variables=["context", "question"]
         )
 
-        llm = ChatGroq(
+        # Retries are left to the scheduler (max_retries=0) so a 429 backs off
+        # every request instead of each client retrying on its own.
+        # GROQ_API_BASE points both clients at another endpoint (fake_groq_server.py).
+        self.llm = ChatGroq(
             api_key=self.groq_api_key,
             model=self.model_name,
+            max_retries=0,
             # Force the model to output a JSON object
             response_format={"type": "json_object"}
         )
 
-        chain_type_kwargs = {"prompt": PROMPT}
-        self.qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            retriever=retriever,
-            return_source_documents=True,
-            chain_type_kwargs=chain_type_kwargs,
-        )
+        # Groq's JSON mode cannot be combined with streaming, so the streaming
+        # LLM relies on the prompt alone for JSON.
+        self.retriever = retriever
+        self.prompt = PROMPT
+        self.stream_llm = ChatGroq(api_key=self.groq_api_key, model=self.model_name, streaming=True, max_retries=0)
         print(f"[READY] Groq QA chain initialized with model: {self.model_name}")
 
-    def ask(self, query: str) -> dict | list | str:
+    def after_fork(self):
+        """
+        Reopen the Chroma client in a forked worker. The embedding model and a
+        memory-mapped NumPy index are inherited from the master as-is.
+        """
+        reset_vectorstores()
+        if self.sharded:
+            self.retriever = self.build_retriever(k=3)
+            return
+        self.vectordb = get_vectorstore(self.persist_directory, self.embedding_model)
+        if isinstance(self.retriever, NumpyRetriever):
+            self.retriever.vectordb = self.vectordb
+        elif self.retriever is not None:
+            self.retriever = self.build_retriever(k=3)
+
+    def _flight_key(self, query: str):
+        # A re-ingest changes the version, so requests never join a call
+        # that is answering from the previous corpus
+        return normalize_query(query), read_index_version(self.persist_directory)
+
+    def coalescing_stats(self) -> dict:
+        sync, a = self.inflight.stats(), self.ainflight.stats()
+        return {name: sync[name] + a[name] for name in sync}
+
+    def build_prompt(self, query: str, docs) -> str:
+        # Overlapping / duplicate chunks are removed and the rest packed under the budget
+        with span("context_build"):
+            context, _ = build_context(docs, self.context_token_budget)
+            return self.prompt.format(context=context, question=query)
+
+    def _lookup_cache(self, query: str, vector=None):
+        """
+        Answer-cache lookup; returns (answer or None, query vector, index
+        version), the last two to pass to a later put.
+        """
+        if not self.answer_cache:
+            return None, vector, None
+        # Read before the lookup: a re-ingest while the answer is computed makes it stale
+        version = self.answer_cache.current_version()
+        with span("answer_cache"):
+            cached, query_vector = self.answer_cache.get(query, vector)
+        CACHE_LOOKUPS.inc(cache="answer", result="miss" if cached is None else "hit")
+        return cached, query_vector, version
+
+    def _cache_answer(self, query: str, answer, query_vector, cache_version):
+        # Only cache answers the frontend can render
+        if self.answer_cache and parse_answer_json(answer)[1]:
+            self.answer_cache.put(query, answer, query_vector, cache_version)
+
+    def _finish_answer(self, query: str, query_vector, cache_version, message, reserved_tokens: int):
+        usage = getattr(message, "usage_metadata", None) or {}
+        self.scheduler.settle(reserved_tokens, usage.get("total_tokens"))
+        answer = message.content
+        self._cache_answer(query, answer, query_vector, cache_version)
+        return answer
+
+    def _retrieve(self, query: str, query_vector=None) -> List[Document]:
+        # The vector the cache lookup already computed is reused, so a
+        # question is embedded once per request
+        with span("retrieve"):
+            if query_vector is None:
+                query_vector = self.embeddings.embed_query(query)
+            return self.retrieve_batch([query_vector])[0]
+
+    def _answer(self, query: str, query_vector, cache_version) -> dict | list | str:
+        # retrieve -> prompt -> LLM; only the LLM call waits for admission
+        docs = self._retrieve(query, query_vector)
+        return self._answer_from_docs(query, query_vector, cache_version, docs)
+
+    def _answer_from_docs(self, query: str, query_vector, cache_version, docs,
+                          queue_timeout: Optional[float] = None) -> dict | list | str:
+        prompt = self.build_prompt(query, docs)
+        tokens = estimate_tokens(prompt)
+        with span("llm"):
+            message = self.scheduler.run(lambda: self.llm.invoke(prompt), tokens, queue_timeout)
+        return self._finish_answer(query, query_vector, cache_version, message, tokens)
+
+    async def _aanswer(self, query: str, query_vector, cache_version) -> dict | list | str:
+        docs = await asyncio.to_thread(self._retrieve, query, query_vector)
+        prompt = self.build_prompt(query, docs)
+        tokens = estimate_tokens(prompt)
+        with span("llm"):
+            message = await self.scheduler.arun(lambda: self.llm.ainvoke(prompt), tokens)
+        return self._finish_answer(query, query_vector, cache_version, message, tokens)
+
+    def ask(self, query: str, query_vector=None) -> dict | list | str:
         """
         Ask a question and get an LLM-generated answer.
         The answer is expected to be a parsed JSON object (dict or list).
+        Pass `query_vector` if the question is already embedded.
         """
-        if not self.qa_chain:
+        if not self.llm:
             self.create_qa_chain()
 
+        cached, query_vector, cache_version = self._lookup_cache(query, query_vector)
+        if cached is not None:
+            return cached
+
         try:
-            # Use .invoke() which is the standard LangChain interface
-            result = self.qa_chain.invoke({"query": query})
+            return self.inflight.do(self._flight_key(query),
+                                    lambda: self._answer(query, query_vector, cache_version))
+        except LLMBusyError:
+            raise
         except Exception as e:
             print(f"[ERROR] Failed to get response from Groq: {e}")
-            return "Error: Could not get answer at this time."
+            raise LLMCallError(str(e)) from e
+
+    def retrieve_batch(self, vectors: Sequence[List[float]]) -> List[List[Document]]:
+        """
+        Retrieve for many embedded questions at once: one matrix product over
+        the NumPy index, or one Chroma query carrying every embedding (per
+        shard, in parallel, for a sharded store). MMR on Chroma has no batched
+        form and runs per question.
+        """
+        k = self.retriever_k
+        if isinstance(self.retriever, ShardedRetriever):
+            return self.retriever.search_by_vectors(vectors)
+        if isinstance(self.retriever, NumpyRetriever):
+            self.retriever.refresh()
+            return self.retriever.index.similarity_search_by_vectors(vectors, k, self.search_type)
+        # Chroma only accepts plain floats (cached vectors are NumPy arrays)
+        vectors = [[float(x) for x in vector] for vector in vectors]
+        if self.search_type == "mmr":
+            return [self.vectordb.max_marginal_relevance_search_by_vector(vector, k=k, fetch_k=4 * k)
+                    for vector in vectors]
+        results = self.vectordb._collection.query(
+            query_embeddings=vectors, n_results=k,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+            for texts, metadatas in zip(results["documents"], results["metadatas"])
+        ]
+
+    def ask_batch(
+        self,
+        queries: Sequence[str],
+        concurrency: int = BATCH_CONCURRENCY,
+        lookup: Optional[Callable[[str, List[float]], Optional[str]]] = None,
+        queue_timeout: float = BATCH_QUEUE_TIMEOUT,
+    ) -> Iterator[Tuple[int, dict | list | str, Optional[str]]]:
+        """
+        Answer many questions, yielding (index into `queries`, answer, error)
+        as each one finishes, in completion order. Answers are what ask()
+        would return; error is None, "rate_limited" if the LLM scheduler did
+        not admit the call within `queue_timeout` seconds, or "llm_error".
+
+        Repeated questions are answered once. The questions are embedded in
+        one batch and retrieved together; then up to `concurrency` LLM calls
+        run at a time. `lookup(question, vector)` is tried before the answer
+        cache (e.g. precomputed FAQ answers).
+        """
+        if not self.llm:
+            self.create_qa_chain()
+
+        groups = {}
+        for i, query in enumerate(queries):
+            groups.setdefault(normalize_query(query), []).append(i)
+        unique = [queries[indices[0]] for indices in groups.values()]
+        if not unique:
+            return
+        with span("embed_batch"):
+            vectors = self.embeddings.embed_documents(unique)
+
+        pending = []
+        for indices, query, vector in zip(groups.values(), unique, vectors):
+            answer = lookup(query, vector) if lookup else None
+            cache_version = None
+            if answer is None:
+                answer, vector, cache_version = self._lookup_cache(query, vector)
+            if answer is None:
+                pending.append((indices, query, vector, cache_version))
+                continue
+            for i in indices:
+                yield i, answer, None
+        if not pending:
+            return
+
+        with span("retrieve_batch"):
+            docs_per_query = self.retrieve_batch([vector for _, _, vector, _ in pending])
+        pool = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(pending))),
+                                  thread_name_prefix="ask-batch")
+        try:
+            futures = {
+                pool.submit(self._answer_from_docs, query, vector, cache_version, docs, queue_timeout): indices
+                for (indices, query, vector, cache_version), docs in zip(pending, docs_per_query)
+            }
+            for future in as_completed(futures):
+                answer, error = None, None
+                try:
+                    answer = future.result()
+                except LLMBusyError as e:
+                    print(f"[WARNING] Batch question not admitted to Groq: {e}")
+                    answer, error = ERROR_ANSWER, "rate_limited"
+                except Exception as e:
+                    print(f"[ERROR] Failed to get response from Groq: {e}")
+                    answer, error = ERROR_ANSWER, "llm_error"
+                for i in futures[future]:
+                    yield i, answer, error
+        finally:
+            # A client that stops reading must not keep the remaining calls queued
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def aask(self, query: str, query_vector=None) -> dict | list | str:
+        """
+        Async variant of ask() for the ASGI server: the Groq call goes through
+        ainvoke() and the cache lookup (which may embed the question) runs in a
+        worker thread, so the event loop is never blocked.
+        """
+        if not self.llm:
+            self.create_qa_chain()
+
+        cached, query_vector, cache_version = await asyncio.to_thread(self._lookup_cache, query, query_vector)
+        if cached is not None:
+            return cached
+
+        try:
+            return await self.ainflight.do(self._flight_key(query),
+                                           lambda: self._aanswer(query, query_vector, cache_version))
+        except LLMBusyError:
+            raise
+        except Exception as e:
+            print(f"[ERROR] Failed to get response from Groq: {e}")
+            raise LLMCallError(str(e)) from e
+
+    def stream(self, query: str, query_vector=None) -> Iterator[str]:
+        """
+        Ask a question and yield the answer text as the LLM produces it.
+        Cached answers are yielded in one piece.
+        """
+        if not self.llm:
+            self.create_qa_chain()
+
+        cached, query_vector, cache_version = self._lookup_cache(query, query_vector)
+        if cached is not None:
+            yield cached
+            return
+
+        docs = self._retrieve(query, query_vector)
+        prompt = self.build_prompt(query, docs)
+
+        def start_stream():
+            # A 429 surfaces on the first chunk, so admission covers opening
+            # the stream; the slot is released once tokens start flowing
+            chunks = self.stream_llm.stream(prompt)
+            return chunks, next(chunks, None)
+
+        tokens = estimate_tokens(prompt)
+        with span("llm_first_token"):
+            chunks, first = self.scheduler.run(start_stream, tokens)
+        parts, used_tokens = [], None
+        try:
+            for chunk in itertools.chain([first] if first is not None else [], chunks):
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage:
+                    used_tokens = usage.get("total_tokens", used_tokens)
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+        finally:
+            # Also runs when the client disconnects mid-answer; without usage
+            # the reservation stands as the estimate
+            self.scheduler.settle(tokens, tokens if used_tokens is None else used_tokens)
 
-        # The 'result' key now contains the parsed dictionary/list from the JSON output
-        answer = result.get("result")
-        return answer
\ No newline at end of file
+        self._cache_answer(query, "".join(parts), query_vector, cache_version)
\ No newline at end of file
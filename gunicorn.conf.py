@@ -0,0 +1,71 @@
+"""
+Production launcher: gunicorn -c gunicorn.conf.py
+
+The master imports app.py, loads the embedding model and the memory-mapped
+NumPy index once, and forks workers that share those pages copy-on-write.
+Each worker reopens its own Chroma client and follows re-ingestion through
+the index version (see NumpyRetriever.refresh).
+"""
+import gc
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+# --------------- BEFORE TORCH IS IMPORTED --------------- #
+# The cores are divided between the workers (post_fork applies the same
+# count to torch), and no tokenizer thread pool is started in the master.
+os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+# The model is loaded synchronously in when_ready, not by a warmup thread
+os.environ.setdefault("WARMUP_ON_START", "0")
+# A memory-mapped index is shared by every worker; Chroma's is not
+os.environ.setdefault("RETRIEVER_BACKEND", "numpy")
+
+
+# --------------- BEFORE THE APP IS IMPORTED --------------- #
+def split_quota(name: str):
+    """
+    LLM_*_PER_MINUTE is the API key's quota, but every worker runs its own
+    scheduler: give each an equal share. The total is kept aside so a config
+    reload does not divide it again.
+    """
+    total = os.environ.setdefault(f"{name}_TOTAL", os.getenv(name, "0"))
+    os.environ[name] = str(float(total) / workers)
+
+
+split_quota("LLM_REQUESTS_PER_MINUTE")
+split_quota("LLM_TOKENS_PER_MINUTE")
+
+# --------------- SERVER --------------- #
+wsgi_app = "app:app"
+bind = os.getenv("BIND", "0.0.0.0:5000")
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", 4))
+preload_app = True
+timeout = 120
+graceful_timeout = 30
+
+
+# --------------- HOOKS --------------- #
+def when_ready(server):
+    import app
+
+    app.preload_before_fork()
+    # Objects that survive until fork are never touched by the collector
+    # again, so workers do not dirty their shared pages by scanning them
+    gc.collect()
+    gc.freeze()
+    server.log.info("Model and index loaded in master; forking workers.")
+
+
+def post_fork(server, worker):
+    try:
+        import torch
+
+        torch.set_num_threads(int(os.environ["OMP_NUM_THREADS"]))
+    except ImportError:
+        pass
+
+    import app
+
+    app.after_fork()
@@ -0,0 +1,172 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from chat_history import ensure_schema
+from db import get_connection
+from metrics import DB_ERRORS, span
+
+# --------------- CONFIGURATION --------------- #
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", 10_000))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", 200))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", 0.5))     # seconds
+HISTORY_ENQUEUE_TIMEOUT = float(os.getenv("HISTORY_ENQUEUE_TIMEOUT", 5.0))   # max backpressure wait
+HISTORY_FLUSH_RETRIES = 3
+
+INSERT_SQL = "INSERT INTO chat_history (session_id, sender, message) VALUES (%s, %s, %s)"
+
+logger = logging.getLogger("chatbot.history")
+
+Row = Tuple[Optional[str], str, str]  # (session_id, sender, message)
+
+
+class ChatHistoryWriter:
+    """
+    Write-behind persistence for chat_history.
+
+    Request handlers enqueue rows and return immediately; a background thread
+    drains the bounded queue and writes each batch with one multi-row INSERT
+    (mysql.connector rewrites executemany() on INSERT ... VALUES into a single
+    statement) and one commit. A batch is flushed when it reaches
+    `batch_size` rows or `flush_interval` seconds after its first row.
+    When the queue is full, enqueue() blocks (backpressure) for up to
+    `enqueue_timeout` seconds before giving up on the row.
+    """
+
+    def __init__(
+        self,
+        connection_factory: Callable = get_connection,
+        max_queue: int = HISTORY_QUEUE_SIZE,
+        batch_size: int = HISTORY_BATCH_SIZE,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL,
+        enqueue_timeout: float = HISTORY_ENQUEUE_TIMEOUT,
+    ):
+        self.connection_factory = connection_factory
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "dropped": 0, "failed": 0}
+
+    # ---------------- PRODUCER SIDE ---------------- #
+    def _ensure_started(self):
+        # Started lazily, and again in a forked child: threads do not survive fork()
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="chat-history-writer", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def enqueue(self, sender: str, message: str, session_id: Optional[str] = None, block: bool = True) -> bool:
+        """
+        Queue one row of `session_id`'s conversation for persistence. Blocks
+        while the queue is full (up to enqueue_timeout) unless block=False.
+        Returns False if the row was not queued.
+        """
+        self._ensure_started()
+        try:
+            self._queue.put((session_id, sender, message), block=block,
+                            timeout=self.enqueue_timeout if block else None)
+        except queue.Full:
+            if block:
+                self.stats["dropped"] += 1
+                logger.error("chat_history queue full; dropping row from %s", sender)
+            return False
+        self.stats["enqueued"] += 1
+        return True
+
+    # ---------------- CONSUMER SIDE ---------------- #
+    def _next_batch(self) -> List[Row]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+        self._drain()
+
+    def _drain(self):
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._flush(batch)
+
+    def _flush(self, rows: List[Row]):
+        # Once per process: create or migrate the table before the first write
+        ensure_schema(self.connection_factory)
+        for attempt in range(1, HISTORY_FLUSH_RETRIES + 1):
+            conn = self.connection_factory()
+            if conn:
+                try:
+                    with span("history_flush"):
+                        cursor = conn.cursor()
+                        cursor.executemany(INSERT_SQL, rows)
+                        conn.commit()
+                        cursor.close()
+                    self.stats["written"] += len(rows)
+                    self.stats["batches"] += 1
+                    return
+                except Exception as e:
+                    DB_ERRORS.inc(operation="history_insert")
+                    logger.error("Failed to write %d chat_history rows (attempt %d): %s", len(rows), attempt, e)
+                finally:
+                    conn.close()
+            if attempt < HISTORY_FLUSH_RETRIES and not self._stopping.is_set():
+                time.sleep(attempt)
+        self.stats["failed"] += len(rows)
+        logger.error("Giving up on %d chat_history rows", len(rows))
+
+    def stop(self, timeout: float = 10.0):
+        """Flush everything still queued and stop the writer thread."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_history_writer() -> ChatHistoryWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ChatHistoryWriter()
+                atexit.register(_writer.stop)
+    return _writer
@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+import uuid
+from typing import Dict, List, Tuple
+
+# --------------- CONFIGURATION --------------- #
+# Root of the vector store shared by ingestion and serving
+CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+# Stored next to the Chroma files so the manifest always describes that store
+MANIFEST_NAME = "ingest_manifest.json"
+# Rewritten after every ingest so readers can cheaply detect a changed index
+INDEX_VERSION_NAME = "index_version"
+HASH_BLOCK_SIZE = 1 << 20
+
+
+# --------------- HASHING --------------- #
+def file_sha256(path: str) -> str:
+    """
+    Hash a file's content without reading it into memory at once.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def doc_id_for(path: str, file_hash: str) -> str:
+    """
+    Id prefix for a document's chunks. Depends on both path and content, so an
+    edited file never reuses the ids of its previous version and two copies of
+    the same PDF never collide.
+    """
+    return hashlib.sha256(f"{path}\0{file_hash}".encode("utf-8")).hexdigest()[:20]
+
+
+# --------------- MANIFEST I/O --------------- #
+def manifest_path(persist_directory: str) -> str:
+    return os.path.join(persist_directory, MANIFEST_NAME)
+
+
+def load_manifest(persist_directory: str) -> Dict:
+    """
+    Return the manifest of the store, or an empty one if it was never written.
+
+    Layout: {"params": {...}, "files": {path: {"sha256": ..., "chunk_ids": [...]}}}
+    """
+    path = manifest_path(persist_directory)
+    if not os.path.exists(path):
+        return {"params": {}, "files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(persist_directory: str, manifest: Dict):
+    """
+    Atomically replace the manifest so a crash never leaves it half written.
+    """
+    os.makedirs(persist_directory, exist_ok=True)
+    path = manifest_path(persist_directory)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+# --------------- DIFFING --------------- #
+def diff_manifest(manifest: Dict, file_hashes: Dict[str, str], params: Dict) -> Tuple[List[str], List[str]]:
+    """
+    Compare the current PDFs against the manifest.
+
+    Returns (paths_to_ingest, paths_to_remove). Changed files appear in both
+    lists: their old vectors are removed and the new version is ingested.
+    When the chunking/embedding params changed, every file is treated as changed.
+    """
+    known = manifest.get("files", {})
+    if manifest.get("params") != params:
+        return list(file_hashes), list(known)
+
+    to_ingest = [p for p, h in file_hashes.items() if known.get(p, {}).get("sha256") != h]
+    to_remove = [p for p in known if p not in file_hashes or p in to_ingest]
+    return to_ingest, to_remove
+
+
+# --------------- INDEX VERSION --------------- #
+def bump_index_version(persist_directory: str) -> str:
+    """
+    Record that the store's contents changed. Caches built on top of the index
+    compare this value to decide whether they are stale.
+    """
+    os.makedirs(persist_directory, exist_ok=True)
+    version = uuid.uuid4().hex
+    path = os.path.join(persist_directory, INDEX_VERSION_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+def read_index_version(persist_directory: str) -> str:
+    """Return the current index version, or "" if the store was never versioned."""
+    try:
+        with open(os.path.join(persist_directory, INDEX_VERSION_NAME), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
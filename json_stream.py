@@ -0,0 +1,82 @@
+import re
+import json
+from typing import List, Tuple
+
+TITLE_PATTERN = re.compile(r'"title"\s*:\s*"((?:[^"\\]|\\.)*)"')
+BLOCK_TYPES = {"header", "section", "paragraph"}
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class IncrementalJSONParser:
+    """
+    Consumes the model's JSON answer as it streams in and reports the reply
+    objects the frontend renders as soon as each one closes:
+
+        ("block", {"index": i, "block": {...header/section/paragraph...}})
+        ("item",  {"block": i, "title": "...", "item": {"scheme": ..., "description": ...}})
+
+    Items are reported while their section is still open, so a long section
+    renders line by line. Works whether the blocks are the top-level array or
+    wrapped in an object (as JSON mode requires).
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._stack: List[Tuple[str, int]] = []  # (opening char, offset)
+        self._in_string = False
+        self._escaped = False
+        self.blocks_emitted = 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, dict]]:
+        """Add streamed text and return the events completed by it."""
+        self.text += chunk
+        events = []
+        text = self.text
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append((char, pos))
+            elif char in "}]" and self._stack:
+                opening, start = self._stack.pop()
+                if char == "}" and opening == "{":
+                    event = self._object_closed(start, pos + 1)
+                    if event:
+                        events.append(event)
+        self._pos = len(text)
+        return events
+
+    def _object_closed(self, start: int, end: int):
+        try:
+            obj = json.loads(self.text[start:end])
+        except json.JSONDecodeError:
+            return None
+        if obj.get("type") in BLOCK_TYPES:
+            index = self.blocks_emitted
+            self.blocks_emitted += 1
+            return "block", {"index": index, "block": obj}
+        if "scheme" in obj:
+            # The enclosing section is the nearest open object; its title (if
+            # already streamed) lets the client label the section early.
+            title = None
+            for opening, parent_start in reversed(self._stack):
+                if opening == "{":
+                    match = TITLE_PATTERN.search(self.text, parent_start, start)
+                    if match:
+                        title = json.loads(f'"{match.group(1)}"')
+                    break
+            return "item", {"block": self.blocks_emitted, "title": title, "item": obj}
+        return None
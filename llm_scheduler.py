@@ -0,0 +1,358 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from metrics import LLM_ERRORS, STAGE_SECONDS
+
+# --------------- CONFIGURATION --------------- #
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+# Provider quota for the API key, e.g. 30 and 6000 on Groq's free tier (0 = unlimited)
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 0))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", 0))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", 100))
+# A request that cannot start its LLM call within this many seconds is rejected
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 20))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = 0.5   # seconds
+LLM_BACKOFF_MAX = 8.0    # seconds
+# Completion tokens assumed per call when reserving token budget
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", 512))
+
+logger = logging.getLogger("chatbot.llm")
+
+
+class LLMBusyError(RuntimeError):
+    """
+    Raised when a request cannot be admitted to the LLM before its deadline.
+    `retry_after` is a hint (seconds) for the client's Retry-After header.
+    """
+
+    def __init__(self, reason: str, retry_after: float = 1.0):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt size (~4 characters per token) plus the expected completion."""
+    return len(text) // 4 + LLM_EXPECTED_OUTPUT_TOKENS
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute`.
+
+    reserve() takes tokens on credit (the level may go negative) and returns
+    how long the caller has to wait before spending them, which keeps
+    reservations in arrival order and paces callers at the refill rate.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float, max_wait: float) -> Optional[float]:
+        """Reserve `amount` tokens. Returns the wait in seconds, or None (nothing reserved) if it exceeds max_wait."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            amount = min(amount, self.capacity)
+            wait = max(0.0, (amount - self.level) / self.rate)
+            if wait > max_wait:
+                return None
+            self.level -= amount
+            return wait
+
+    def refund(self, amount: float):
+        """Give back unused tokens (a negative amount charges extra)."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class SlotLimiter:
+    """
+    Counting semaphore shared by threads and event loops, so run() and arun()
+    draw on the same `slots`. Threads wait on a condition; coroutines park a
+    future that release() resolves on the waiter's own loop.
+    """
+
+    def __init__(self, slots: int):
+        self._free = slots
+        self._cond = threading.Condition()
+        self._async_waiters = deque()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._free > 0, timeout):
+                return False
+            self._free -= 1
+            return True
+
+    async def aacquire(self, timeout: float) -> bool:
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._free > 0:
+                    self._free -= 1
+                    return True
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                with self._cond:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+            # Woken by a release; a thread or another coroutine may still win the slot
+
+    def release(self):
+        with self._cond:
+            self._free += 1
+            self._cond.notify()
+            waiters = list(self._async_waiters)
+            self._async_waiters.clear()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # the waiter's loop is closed
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMScheduler:
+    """
+    Admission control in front of the LLM provider.
+
+    A call first joins a bounded wait queue, then waits for one of
+    `max_concurrency` slots, then for request and token budget from the
+    per-minute buckets. Whenever the wait would run past the request's
+    deadline it is rejected straight away with LLMBusyError instead of
+    piling onto the provider. A 429 pauses every caller for the provider's
+    retry-after (or a jittered exponential backoff); the retry then takes
+    its budget from the buckets again.
+
+    The token reservation of a successful call is corrected by the caller
+    with settle() once usage is known; a failed call's is settled here.
+
+    run() serves threads and arun() the event loop; the slots, the buckets
+    and the backoff pause are shared between them.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+        max_queue: int = LLM_QUEUE_SIZE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._slots = SlotLimiter(max_concurrency)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._paused_until = 0.0
+        self.counters = {"admitted": 0, "rejected": 0, "rate_limited": 0, "failed": 0}
+
+    # ---------------- ADMISSION ---------------- #
+    def _reject(self, reason: str):
+        with self._lock:
+            self.counters["rejected"] += 1
+        LLM_ERRORS.inc(error="rejected")
+        logger.warning("LLM request rejected: %s", reason)
+        raise LLMBusyError(reason, self._retry_after())
+
+    def _retry_after(self) -> float:
+        # At least the provider's remaining back-off, and never below a second
+        return max(1.0, self._paused_until - time.monotonic())
+
+    def _enter_queue(self):
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self.counters["rejected"] += 1
+                LLM_ERRORS.inc(error="queue_full")
+                raise LLMBusyError("LLM wait queue is full", self._retry_after())
+            self._waiting += 1
+
+    def _leave_queue(self, admitted: bool):
+        with self._lock:
+            self._waiting -= 1
+            if admitted:
+                self._running += 1
+
+    def _reserve_budget(self, tokens: int, deadline: float) -> float:
+        """Reserve one request and `tokens` tokens; returns the wait before calling."""
+        remaining = deadline - time.monotonic()
+        pause = max(0.0, self._paused_until - time.monotonic())
+        request_wait = self.requests.reserve(1, remaining)
+        if request_wait is None:
+            self._reject("Request budget exhausted until after the deadline")
+        token_wait = self.tokens.reserve(tokens, remaining)
+        if token_wait is None:
+            self.requests.refund(1)
+            self._reject("Token budget exhausted until after the deadline")
+        wait = max(pause, request_wait, token_wait)
+        if wait > remaining:
+            self.requests.refund(1)
+            self.tokens.refund(tokens)
+            self._reject("Rate-limit backoff runs past the deadline")
+        return wait
+
+    def _admitted(self, started: float):
+        with self._lock:
+            self.counters["admitted"] += 1
+        STAGE_SECONDS.observe(time.monotonic() - started, stage="llm_admission")
+
+    def _failed(self, error: BaseException, tokens: int):
+        # Nothing was generated: give the whole reservation back
+        self.settle(tokens, 0)
+        with self._lock:
+            self.counters["failed"] += 1
+        LLM_ERRORS.inc(error=type(error).__name__)
+
+    def _backoff(self, error: BaseException, attempt: int, deadline: float) -> float:
+        delay = retry_after_seconds(error)
+        if delay is None:
+            # Full jitter so the waiting callers do not retry in lockstep
+            delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+        with self._lock:
+            self.counters["rate_limited"] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        LLM_ERRORS.inc(error="rate_limited")
+        logger.warning("LLM rate limited (attempt %d); backing off %.2fs", attempt + 1, delay)
+        if time.monotonic() + delay > deadline:
+            self._reject("Rate-limit backoff runs past the deadline")
+
+    def _finish(self):
+        with self._lock:
+            self._running -= 1
+
+    def settle(self, reserved_tokens: int, used_tokens: Optional[int]):
+        """Correct the token bucket once the provider reports actual usage."""
+        if used_tokens is not None:
+            self.tokens.refund(reserved_tokens - used_tokens)
+
+    # ---------------- SYNC ---------------- #
+    def run(self, fn: Callable[[], Any], tokens: int = 0, timeout: Optional[float] = None) -> Any:
+        """
+        Call `fn` once admitted, retrying it on 429. Raises LLMBusyError if
+        not admitted within `timeout` (default: queue_timeout) seconds. On
+        success the caller must settle() the `tokens` reserved.
+        """
+        started = time.monotonic()
+        deadline = started + (self.queue_timeout if timeout is None else timeout)
+        self._enter_queue()
+        acquired = False
+        try:
+            acquired = self._slots.acquire(timeout=max(0.0, deadline - time.monotonic()))
+        finally:
+            self._leave_queue(acquired)
+        if not acquired:
+            self._reject("Timed out waiting for an LLM slot")
+        try:
+            time.sleep(self._reserve_budget(tokens, deadline))
+            self._admitted(started)
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return fn()
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempt == self.max_retries:
+                        self._failed(e, tokens)
+                        raise
+                    # The rejected attempt used no tokens; the retry reserves its own
+                    self.settle(tokens, 0)
+                    self._backoff(e, attempt, deadline)
+                    time.sleep(self._reserve_budget(tokens, deadline))
+        finally:
+            self._finish()
+            self._slots.release()
+
+    # ---------------- ASYNC ---------------- #
+    async def arun(self, fn: Callable[[], Awaitable[Any]], tokens: int = 0, timeout: Optional[float] = None) -> Any:
+        """Async variant of run(): `fn` returns an awaitable."""
+        started = time.monotonic()
+        deadline = started + (self.queue_timeout if timeout is None else timeout)
+        self._enter_queue()
+        acquired = False
+        try:
+            acquired = await self._slots.aacquire(max(0.0, deadline - time.monotonic()))
+        finally:
+            self._leave_queue(acquired)
+        if not acquired:
+            self._reject("Timed out waiting for an LLM slot")
+        try:
+            await asyncio.sleep(self._reserve_budget(tokens, deadline))
+            self._admitted(started)
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return await fn()
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempt == self.max_retries:
+                        self._failed(e, tokens)
+                        raise
+                    self.settle(tokens, 0)
+                    self._backoff(e, attempt, deadline)
+                    await asyncio.sleep(self._reserve_budget(tokens, deadline))
+        finally:
+            self._finish()
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "waiting": self._waiting,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+            **self.counters,
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Process-wide scheduler: the provider's quota is per API key, not per model object."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
@@ -0,0 +1,165 @@
+import os
+import time
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from langchain_community.vectorstores import Chroma
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from query_embedder import BatchingQueryEmbedder
+
+# Seconds after a failed background load before the next request retries it
+MODEL_LOAD_RETRY_SECONDS = float(os.getenv("MODEL_LOAD_RETRY_SECONDS", 30))
+
+# --------------- SHARED MODELS --------------- #
+# One embedding model and one Chroma client per process, whoever asks first
+# (GroqRAGModel, PDFGroqRAG or an ingestion script) pays the load cost.
+_lock = threading.RLock()
+_embeddings: Dict[str, HuggingFaceEmbeddings] = {}
+_query_embedders: Dict[str, BatchingQueryEmbedder] = {}
+_vectorstores: Dict[Tuple[str, str], Chroma] = {}
+
+
+def get_embeddings(model_name: str) -> HuggingFaceEmbeddings:
+    """Return the process-wide embedding model for `model_name`, loading it once."""
+    with _lock:
+        if model_name not in _embeddings:
+            print(f"[INFO] Loading embedding model {model_name}...")
+            _embeddings[model_name] = HuggingFaceEmbeddings(model_name=model_name)
+        return _embeddings[model_name]
+
+
+def get_query_embedder(model_name: str) -> BatchingQueryEmbedder:
+    """
+    Return the process-wide micro-batching wrapper around `model_name`.
+    Concurrent embed_query() calls through it share one forward pass.
+    """
+    with _lock:
+        if model_name not in _query_embedders:
+            _query_embedders[model_name] = BatchingQueryEmbedder(get_embeddings(model_name))
+        return _query_embedders[model_name]
+
+
+def get_vectorstore(persist_directory: str, model_name: str) -> Chroma:
+    """Return the process-wide Chroma store at `persist_directory`, opening it once."""
+    key = (os.path.abspath(persist_directory), model_name)
+    with _lock:
+        if key not in _vectorstores:
+            _vectorstores[key] = Chroma(
+                persist_directory=persist_directory,
+                embedding_function=get_query_embedder(model_name),
+            )
+        return _vectorstores[key]
+
+
+def reset_vectorstores():
+    """
+    Forget Chroma clients opened before fork(). The embedding model can be
+    shared with a forked child, but its SQLite connections cannot, so a
+    worker calls this and then opens its own store.
+    """
+    with _lock:
+        _vectorstores.clear()
+    try:
+        from chromadb.api.client import SharedSystemClient
+
+        SharedSystemClient.clear_system_cache()
+    except (ImportError, AttributeError):
+        pass
+
+
+# --------------- BACKGROUND WARMUP --------------- #
+class ModelLoadError(RuntimeError):
+    """The last attempt to build a BackgroundLoader's object failed."""
+
+
+class BackgroundLoader:
+    """
+    Builds an expensive object once, either in a background thread started
+    with start() or on first use of get(). Servers use it to bind their port
+    immediately and report readiness separately from liveness. A failed load
+    is retried by the first get() made `retry_seconds` after it.
+    """
+
+    def __init__(self, factory: Callable, name: str = "model", retry_seconds: float = MODEL_LOAD_RETRY_SECONDS):
+        self.factory = factory
+        self.name = name
+        self.retry_seconds = retry_seconds
+        self.value = None
+        self.error: Optional[BaseException] = None
+        self.load_seconds: Optional[float] = None
+        self.failures = 0
+        self._failed_at: Optional[float] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._started = False
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set() and self.error is None
+
+    def _load(self, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            self.value = self.factory(*args, **kwargs)
+        except BaseException as e:
+            self.error = e
+            self.failures += 1
+            self._failed_at = time.monotonic()
+            print(f"[ERROR] Failed to load {self.name}: {e}")
+        finally:
+            self.load_seconds = round(time.monotonic() - started, 3)
+            self._ready.set()
+
+    def start(self):
+        """Begin loading in a background thread (no-op if already started and not due for a retry)."""
+        with self._lock:
+            if self._started and not self._retry_due():
+                return
+            self._started = True
+            self.error = None
+            self._ready.clear()
+        threading.Thread(target=self._load, name=f"warmup-{self.name}", daemon=True).start()
+
+    def load(self, *args, **kwargs):
+        """
+        Build the object in the calling thread, passing extra arguments to the
+        factory. Used by a pre-fork master, which must not leave threads behind.
+        """
+        with self._lock:
+            if self._started:
+                raise RuntimeError(f"{self.name} is already loading")
+            self._started = True
+        self._load(*args, **kwargs)
+        return self.get(0)
+
+    def _retry_due(self) -> bool:
+        return (self.error is not None and self._ready.is_set()
+                and time.monotonic() - self._failed_at >= self.retry_seconds)
+
+    def get(self, timeout: Optional[float] = None):
+        """
+        Return the loaded object, waiting up to `timeout` seconds for warmup.
+        Raises TimeoutError while still loading and ModelLoadError if the
+        last load failed and is not yet due for a retry.
+        """
+        self.start()
+        loaded = self._ready.wait(timeout)
+        with self._lock:
+            # Re-checked under the lock: another caller may have just started a retry
+            loaded, error, value = loaded and self._ready.is_set(), self.error, self.value
+        if not loaded:
+            raise TimeoutError(f"{self.name} is still warming up")
+        if error is not None:
+            raise ModelLoadError(f"{self.name} failed to load: {error}") from error
+        return value
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "ready": self.ready,
+            "loading": self._started and not self._ready.is_set(),
+            "error": str(self.error) if self.error else None,
+            "failures": self.failures,
+            "load_seconds": self.load_seconds,
+        }
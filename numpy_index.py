@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from index_manifest import read_index_version
+
+# --------------- CONFIGURATION --------------- #
+NUMPY_INDEX_DIR = os.getenv("NUMPY_INDEX_DIR", "./numpy_index")
+# int8 reads 4x less memory per query than float32; float16 saves the same
+# memory as int8 less but NumPy has no BLAS kernel for it, so it scores slowest
+NUMPY_INDEX_DTYPE = os.getenv("NUMPY_INDEX_DTYPE", "int8")  # float32 | float16 | int8
+EXPORT_PAGE_SIZE = 5000
+# Quantized rows are widened to float32 this many at a time while scoring
+# (small enough for the temporary block to stay in CPU cache)
+SCORE_BLOCK_ROWS = 2048
+CURRENT_NAME = "CURRENT"
+# How often (seconds) a retriever checks whether a re-ingest made its index stale
+INDEX_CHECK_INTERVAL = float(os.getenv("NUMPY_INDEX_CHECK_INTERVAL", 5.0))
+
+
+# --------------- EXPORT --------------- #
+def export_collection(vectordb, index_dir: str = NUMPY_INDEX_DIR, dtype: str = NUMPY_INDEX_DTYPE,
+                      index_version: str = "") -> str:
+    """
+    Export a Chroma collection into memory-mappable files:
+
+        vectors.npy   (n, dim) unit-normalized embeddings in float32/float16/int8
+        scales.npy    (n,) per-row dequantization scale (int8 only)
+        docs.jsonl    one {"id", "text", "metadata"} record per row
+        offsets.npy   (n + 1,) byte offsets of the records in docs.jsonl
+        meta.json     count, dim, dtype and the index version it was built from
+
+    Each export goes to a fresh sub-directory and CURRENT is switched to it
+    atomically, so readers never see a half-written index.
+    Returns the path of the new export.
+    """
+    if dtype not in ("float32", "float16", "int8"):
+        raise ValueError(f"Unsupported index dtype: {dtype}")
+    collection = vectordb._collection
+    count = collection.count()
+    if count == 0:
+        raise ValueError("Chroma collection is empty; nothing to export.")
+
+    os.makedirs(index_dir, exist_ok=True)
+    export_name = f"v-{index_version or 'unversioned'}-{dtype}"
+    export_dir = os.path.join(index_dir, export_name)
+    shutil.rmtree(export_dir, ignore_errors=True)
+    os.makedirs(export_dir)
+
+    vectors = None
+    scales = np.ones(count, dtype=np.float32)
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    row = 0
+    with open(os.path.join(export_dir, "docs.jsonl"), "wb") as docs_file:
+        for offset in range(0, count, EXPORT_PAGE_SIZE):
+            page = collection.get(include=["embeddings", "documents", "metadatas"],
+                                  limit=EXPORT_PAGE_SIZE, offset=offset)
+            embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+            if embeddings.size == 0:
+                break
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    os.path.join(export_dir, "vectors.npy"), mode="w+",
+                    dtype=np.dtype(dtype), shape=(count, embeddings.shape[1]),
+                )
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.where(norms == 0, 1, norms)
+            end = row + len(embeddings)
+            if dtype == "int8":
+                page_scales = np.abs(embeddings).max(axis=1) / 127.0
+                page_scales[page_scales == 0] = 1.0
+                vectors[row:end] = np.round(embeddings / page_scales[:, None]).astype(np.int8)
+                scales[row:end] = page_scales
+            else:
+                vectors[row:end] = embeddings
+
+            for i, (doc_id, text, metadata) in enumerate(zip(page["ids"], page["documents"], page["metadatas"])):
+                line = json.dumps({"id": doc_id, "text": text, "metadata": metadata or {}}).encode("utf-8") + b"\n"
+                docs_file.write(line)
+                offsets[row + i + 1] = offsets[row + i] + len(line)
+            row = end
+
+    if vectors is None:
+        # count() said otherwise, but the first page came back empty (e.g. a
+        # concurrent delete): keep serving the previous export
+        shutil.rmtree(export_dir, ignore_errors=True)
+        raise ValueError("Chroma collection returned no embeddings; nothing to export.")
+    vectors.flush()
+    np.save(os.path.join(export_dir, "offsets.npy"), offsets[: row + 1])
+    if dtype == "int8":
+        np.save(os.path.join(export_dir, "scales.npy"), scales[:row])
+    with open(os.path.join(export_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"count": row, "dim": int(vectors.shape[1]), "dtype": dtype, "index_version": index_version}, f)
+
+    tmp_current = os.path.join(index_dir, f"{CURRENT_NAME}.tmp")
+    with open(tmp_current, "w", encoding="utf-8") as f:
+        f.write(export_name)
+    os.replace(tmp_current, os.path.join(index_dir, CURRENT_NAME))
+
+    # Older exports are no longer reachable through CURRENT. Processes that
+    # still map them keep working (on POSIX) until they reload.
+    for name in os.listdir(index_dir):
+        if name.startswith("v-") and name != export_name:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+    print(f"[SUCCESS] Exported {row} vectors ({dtype}) to {export_dir}")
+    return export_dir
+
+
+# --------------- SEARCH --------------- #
+class NumpyVectorIndex:
+    """
+    Read-only, memory-mapped vector index. Vectors and document records are
+    mapped from disk (np.load(mmap_mode="r")), so pages are shared through the
+    OS page cache by every process that opens the same export.
+    """
+
+    def __init__(self, index_dir: str = NUMPY_INDEX_DIR):
+        with open(os.path.join(index_dir, CURRENT_NAME), "r", encoding="utf-8") as f:
+            self.path = os.path.join(index_dir, f.read().strip())
+        with open(os.path.join(self.path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.index_version = self.meta.get("index_version", "")
+        self.vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(self.path, "offsets.npy"), mmap_mode="r")
+        scales_path = os.path.join(self.path, "scales.npy")
+        self.scales = np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None
+        self._docs_fd = os.open(os.path.join(self.path, "docs.jsonl"), os.O_RDONLY)
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        # query is one vector (dim,) or a batch as columns (dim, n)
+        if self.vectors.dtype == np.float32:
+            return self.vectors @ query
+        scores = np.empty((len(self),) + query.shape[1:], dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            block = self.vectors[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales.reshape((-1,) + (1,) * (scores.ndim - 1))
+        return scores
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), int(i)) for i in top]
+
+    def search(self, query_vector, k: int = 3) -> List[Tuple[float, int]]:
+        """Return the top-k (cosine score, row) pairs, best first."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        return self._top_k(self._scores(query), k)
+
+    def search_batch(self, query_vectors, k: int = 3) -> List[List[Tuple[float, int]]]:
+        """search() for many queries with one pass over the index."""
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        scores = self._scores(np.ascontiguousarray(queries.T))
+        return [self._top_k(scores[:, i], k) for i in range(scores.shape[1])]
+
+    def _row_vectors(self, rows: List[int]) -> np.ndarray:
+        vectors = self.vectors[rows].astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows][:, None]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def mmr_search(self, query_vector, k: int = 3, fetch_k: int = 20,
+                   lambda_mult: float = 0.5) -> List[Tuple[float, int]]:
+        """
+        Maximal marginal relevance: pick k of the fetch_k nearest rows, trading
+        similarity to the query against similarity to rows already picked.
+        """
+        return self._mmr_select(self.search(query_vector, max(k, fetch_k)), k, lambda_mult)
+
+    def _mmr_select(self, candidates: List[Tuple[float, int]], k: int,
+                    lambda_mult: float = 0.5) -> List[Tuple[float, int]]:
+        rows = [row for _, row in candidates]
+        relevance = np.array([score for score, _ in candidates], dtype=np.float32)
+        vectors = self._row_vectors(rows)
+        selected: List[int] = []
+        redundancy = np.zeros(len(rows), dtype=np.float32)
+        while len(selected) < min(k, len(rows)):
+            mmr = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+            mmr[selected] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            redundancy = np.maximum(redundancy, vectors @ vectors[best])
+        return [candidates[i] for i in selected]
+
+    def get_record(self, row: int) -> dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(os.pread(self._docs_fd, end - start, start))
+
+    def _documents(self, hits: List[Tuple[float, int]]) -> List[Document]:
+        docs = []
+        for score, row in hits:
+            record = self.get_record(row)
+            docs.append(Document(page_content=record["text"], metadata={**record["metadata"], "score": score}))
+        return docs
+
+    def similarity_search_by_vector(self, query_vector, k: int = 3, search_type: str = "similarity") -> List[Document]:
+        hits = self.mmr_search(query_vector, k, fetch_k=4 * k) if search_type == "mmr" else self.search(query_vector, k)
+        return self._documents(hits)
+
+    def similarity_search_by_vectors(self, query_vectors, k: int = 3,
+                                     search_type: str = "similarity") -> List[List[Document]]:
+        """similarity_search_by_vector() for many queries, scoring them all in one pass."""
+        if not len(query_vectors):
+            return []
+        if search_type != "mmr":
+            return [self._documents(hits) for hits in self.search_batch(query_vectors, k)]
+        return [self._documents(self._mmr_select(candidates, k))
+                for candidates in self.search_batch(query_vectors, 4 * k)]
+
+    def close(self):
+        if self._docs_fd is not None:
+            os.close(self._docs_fd)
+            self._docs_fd = None
+
+    def __del__(self):
+        # A replaced index is dropped once the last in-flight search is done with it
+        try:
+            self.close()
+        except (AttributeError, OSError):
+            pass
+
+
+@contextmanager
+def _export_lock(index_dir: str):
+    """Cross-process lock so only one worker re-exports a stale index."""
+    os.makedirs(index_dir, exist_ok=True)
+    try:
+        import fcntl
+    except ImportError:  # Windows: single-process use only
+        yield
+        return
+    with open(os.path.join(index_dir, ".export.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _open_current(index_dir: str, version: str, dtype: str) -> Optional[NumpyVectorIndex]:
+    try:
+        index = NumpyVectorIndex(index_dir)
+    except FileNotFoundError:  # never exported, or swapped out while opening
+        return None
+    if index.index_version == version and index.meta.get("dtype") == dtype:
+        return index
+    index.close()
+    return None
+
+
+def load_or_export_index(vectordb, persist_directory: str, index_dir: str = NUMPY_INDEX_DIR,
+                         dtype: str = NUMPY_INDEX_DTYPE) -> NumpyVectorIndex:
+    """
+    Open the exported index, re-exporting it first if it is missing or was
+    built from an older version of the Chroma store. When several processes
+    notice a stale index at once, one exports and the others open its result.
+    """
+    version = read_index_version(persist_directory)
+    index = _open_current(index_dir, version, dtype)
+    if index is not None:
+        return index
+    with _export_lock(index_dir):
+        index = _open_current(index_dir, version, dtype)
+        if index is not None:
+            return index
+        print("[INFO] NumPy index missing or stale. Exporting from Chroma...")
+        export_collection(vectordb, index_dir, dtype=dtype, index_version=version)
+    return NumpyVectorIndex(index_dir)
+
+
+class NumpyRetriever(BaseRetriever):
+    """
+    LangChain retriever over a NumpyVectorIndex; drop-in for vectordb.as_retriever().
+
+    Given `vectordb` and `persist_directory`, it follows re-ingestion: every
+    INDEX_CHECK_INTERVAL seconds it compares the live index version with its
+    index and swaps in the current export (exporting it if no process has yet).
+    """
+
+    index: Any
+    embeddings: Any
+    k: int = 3
+    search_type: str = "similarity"
+    vectordb: Any = None
+    persist_directory: str = ""
+    index_dir: str = NUMPY_INDEX_DIR
+    _checked_at: float = PrivateAttr(default=0.0)
+    _reload_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def refresh(self):
+        if not self.persist_directory or self.vectordb is None:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < INDEX_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        if read_index_version(self.persist_directory) == self.index.index_version:
+            return
+        with self._reload_lock:
+            if read_index_version(self.persist_directory) != self.index.index_version:
+                self.index = load_or_export_index(self.vectordb, self.persist_directory, self.index_dir,
+                                                  self.index.meta.get("dtype", NUMPY_INDEX_DTYPE))
+                print(f"[INFO] Reloaded NumPy index {self.index.path}")
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: Optional[CallbackManagerForRetrieverRun] = None
+    ) -> List[Document]:
+        self.refresh()
+        return self.index.similarity_search_by_vector(self.embeddings.embed_query(query), self.k, self.search_type)
+
+
+if __name__ == "__main__":
+    from create_vector_db import CHROMA_DB_PATH, EMBED_MODEL
+    from model_registry import get_vectorstore
+
+    parser = argparse.ArgumentParser(description="Export the Chroma DB to a memory-mapped NumPy index.")
+    parser.add_argument("--dtype", choices=["float32", "float16", "int8"], default=NUMPY_INDEX_DTYPE)
+    parser.add_argument("--out", default=NUMPY_INDEX_DIR)
+    args = parser.parse_args()
+    export_collection(get_vectorstore(CHROMA_DB_PATH, EMBED_MODEL), args.out, dtype=args.dtype,
+                      index_version=read_index_version(CHROMA_DB_PATH))
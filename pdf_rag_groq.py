@@ -1,14 +1,28 @@
 import os
 import glob
+import hashlib
 import fitz
-from typing import List, Optional
+from typing import Iterable, List, Optional, Union
 from dotenv import load_dotenv
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.chains import RetrievalQA
 
+from embedding_cache import CachedEmbeddings
+from model_registry import get_embeddings, get_query_embedder, get_vectorstore
+from index_manifest import CHROMA_DB_PATH, bump_index_version
+from sharded_index import SHARD_BY, ShardedRetriever, list_shards, shard_directory
+from create_vector_db import (
+    Chunk,
+    INGEST_WORKERS,
+    EMBED_BATCH_SIZE,
+    add_chunks_to_vectordb,
+    load_pdfs_from_folder,
+    sync_pdfs_to_vectordb,
+    sync_sharded_pdfs,
+)
+
 load_dotenv()
 
 # Optional Groq LLM integration
@@ -29,7 +43,7 @@ class PDFGroqRAG:
         self,
         groq_api_key: Optional[str] = None,
         model_name: str = "llama-3.1-70b-versatile",
-        persist_directory: str = "./chroma_db",
+        persist_directory: str = CHROMA_DB_PATH,
         embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
     ):
         self.groq_api_key = (groq_api_key or os.getenv("GROQ_API_KEY", "")).strip()
@@ -41,6 +55,7 @@ class PDFGroqRAG:
         self.embedding_model = embedding_model
         self.vectordb = None
         self.qa_chain = None
+        self.chunk_count = 0
 
     # ---------------- TEXT EXTRACTION ---------------- #
     def extract_text_from_pdf(self, pdf_path: str) -> str:
@@ -59,12 +74,24 @@ class PDFGroqRAG:
         return splitter.split_text(text)
 
     # ---------------- EMBEDDINGS + VECTOR DB ---------------- #
-    def create_vector_db(self, chunks: List[str]):
+    def create_vector_db(self, chunks: Iterable[Union[str, Chunk]], batch_size: int = EMBED_BATCH_SIZE):
+        """
+        Embed and store chunks batch by batch. Accepts (text, metadata) pairs or
+        plain strings; plain strings get content-hash ids, so re-adding the same
+        text updates it instead of colliding with another run's ids.
+        """
         os.makedirs(self.persist_directory, exist_ok=True)
-        embeddings = HuggingFaceEmbeddings(model_name=self.embedding_model)
+        embeddings = CachedEmbeddings(get_embeddings(self.embedding_model), self.embedding_model)
         vectordb = Chroma(persist_directory=self.persist_directory, embedding_function=embeddings)
-        vectordb.add_texts(chunks, ids=[str(i) for i in range(len(chunks))])
+        pairs = (
+            (c, {"source": f"text-{hashlib.sha256(c.encode('utf-8')).hexdigest()[:20]}", "page": 0})
+            if isinstance(c, str) else c
+            for c in chunks
+        )
+        ids_by_source = add_chunks_to_vectordb(vectordb, pairs, batch_size=batch_size)
+        self.chunk_count = sum(len(ids) for ids in ids_by_source.values())
         vectordb.persist()
+        bump_index_version(self.persist_directory)
         self.vectordb = vectordb
         print(f"[SUCCESS] Vector DB created at: {self.persist_directory}")
         return vectordb
@@ -72,19 +99,28 @@ class PDFGroqRAG:
     def load_existing_vector_db(self):
         if not os.path.exists(self.persist_directory):
             raise FileNotFoundError(f"Chroma DB not found at '{self.persist_directory}'")
-        embeddings = HuggingFaceEmbeddings(model_name=self.embedding_model)
-        self.vectordb = Chroma(persist_directory=self.persist_directory, embedding_function=embeddings)
+        if list_shards(self.persist_directory):
+            # Sharded stores are searched through ShardedRetriever, not one collection
+            print("[INFO] Existing sharded vector DB found.")
+            return None
+        self.vectordb = get_vectorstore(self.persist_directory, self.embedding_model)
         print("[INFO] Existing vector DB loaded.")
         return self.vectordb
 
-    # ---------------- QA CHAIN ---------------- #
-    def create_qa_chain(self):
+    def build_retriever(self, k: int = 3):
+        if list_shards(self.persist_directory):
+            return ShardedRetriever(persist_directory=self.persist_directory, embedding_model=self.embedding_model,
+                                    embeddings=get_query_embedder(self.embedding_model), k=k)
         if not self.vectordb:
             raise ValueError("Vector DB not found. Run ingest_pdfs() or load_existing_vector_db() first.")
+        return self.vectordb.as_retriever(search_kwargs={"k": k})
+
+    # ---------------- QA CHAIN ---------------- #
+    def create_qa_chain(self):
         if not USE_LANGCHAIN_GROQ:
             raise ImportError("langchain-groq not installed. Install via: pip install langchain-groq")
 
-        retriever = self.vectordb.as_retriever(search_kwargs={"k": 3})
+        retriever = self.build_retriever(k=3)
         llm = ChatGroq(api_key=self.groq_api_key, model=self.model_name)
         self.qa_chain = RetrievalQA.from_chain_type(
             llm=llm,
@@ -95,21 +131,58 @@ class PDFGroqRAG:
         return self.qa_chain
 
     # ---------------- MAIN PIPELINE ---------------- #
-    def ingest_pdfs(self, pdf_folder: str = "./data", chunk_size: int = 1000, chunk_overlap: int = 200):
+    def ingest_pdfs(self, pdf_folder: str = "./data", chunk_size: int = 1000, chunk_overlap: int = 200,
+                    workers: int = INGEST_WORKERS, rebuild: bool = False, shard_by: str = SHARD_BY):
+        if shard_by != "none":
+            self.ingest_pdfs_sharded(pdf_folder, chunk_size, chunk_overlap, workers, rebuild, shard_by)
+            return
+
         pdf_files = self.load_pdfs_from_folder(pdf_folder)
         if not pdf_files:
             raise FileNotFoundError(f"No PDFs found in folder: {pdf_folder}")
 
-        print(f"[INFO] Found {len(pdf_files)} PDF(s). Extracting text...")
-        all_texts = [self.extract_text_from_pdf(p) for p in pdf_files]
-        combined_text = "\n\n".join(all_texts)
-        chunks = self.chunk_text(combined_text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        print(f"[INFO] Created {len(chunks)} chunks.")
+        print(f"[INFO] Found {len(pdf_files)} PDF(s). Syncing vector DB with {workers} worker(s)...")
+        vectordb = sync_pdfs_to_vectordb(
+            pdf_files,
+            persist_directory=self.persist_directory,
+            embedding_model=self.embedding_model,
+            workers=workers,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            rebuild=rebuild,
+        )
+        if vectordb is None:
+            self.load_existing_vector_db()
+        else:
+            self.vectordb = vectordb
+        self.chunk_count = self.vectordb._collection.count()
+        if self.chunk_count == 0:
+            raise ValueError("No valid text extracted from PDFs. Please check input files.")
 
-        self.create_vector_db(chunks)
         self.create_qa_chain()
         print("[READY] RAG pipeline initialized.")
 
+    def ingest_pdfs_sharded(self, pdf_folder: str, chunk_size: int = 1000, chunk_overlap: int = 200,
+                            workers: int = INGEST_WORKERS, rebuild: bool = False, shard_by: str = "folder"):
+        """Like ingest_pdfs(), but one shard per sub-folder or category (see sharded_index.py)."""
+        pdf_files = load_pdfs_from_folder(pdf_folder, recursive=True)
+        if not pdf_files:
+            raise FileNotFoundError(f"No PDFs found in folder: {pdf_folder}")
+
+        print(f"[INFO] Found {len(pdf_files)} PDF(s). Syncing shards (by {shard_by}) with {workers} worker(s)...")
+        sync_sharded_pdfs(pdf_files, pdf_folder, self.persist_directory, shard_by, self.embedding_model,
+                          workers, chunk_size, chunk_overlap, rebuild)
+        self.vectordb = None
+        self.chunk_count = sum(
+            get_vectorstore(shard_directory(name, self.persist_directory), self.embedding_model)._collection.count()
+            for name in list_shards(self.persist_directory)
+        )
+        if self.chunk_count == 0:
+            raise ValueError("No valid text extracted from PDFs. Please check input files.")
+
+        self.create_qa_chain()
+        print("[READY] Sharded RAG pipeline initialized.")
+
     def ask(self, query: str) -> str:
         if not self.qa_chain:
             if self.vectordb is None:
@@ -125,7 +198,7 @@ class PDFGroqRAG:
     def search_sources(self, query: str, top_k: int = 3) -> List[str]:
         if not self.vectordb:
             self.load_existing_vector_db()
-        retriever = self.vectordb.as_retriever(search_kwargs={"k": top_k})
+        retriever = self.build_retriever(k=top_k)
         docs = retriever.get_relevant_documents(query)
         return [d.page_content for d in docs]
 
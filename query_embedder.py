@@ -0,0 +1,90 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from metrics import span
+
+# --------------- CONFIGURATION --------------- #
+# Longest a query waits for others to join its batch (0 disables batching)
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", 5))
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", 32))
+
+
+class BatchingQueryEmbedder(Embeddings):
+    """
+    Micro-batches embed_query() calls from concurrent requests.
+
+    Each caller enqueues its question and blocks on a future. A single
+    background thread takes the first waiting question, collects whatever
+    else arrives within `window_ms` (up to `max_batch` questions), embeds them
+    in one embed_documents() call and hands each caller its vector. The extra
+    latency per query is bounded by `window_ms`.
+
+    embed_documents() is already batched by its caller and is passed through.
+    """
+
+    def __init__(self, base: Embeddings, max_batch: int = QUERY_BATCH_MAX,
+                 window_ms: float = QUERY_BATCH_WINDOW_MS):
+        self.base = base
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self._queue = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.stats = {"queries": 0, "batches": 0, "largest_batch": 0}
+
+    def _ensure_started(self):
+        # Started lazily, and again in a forked child: threads do not survive fork()
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            threading.Thread(target=self._run, name="query-embedder", daemon=True).start()
+            self._pid = os.getpid()
+
+    def embed_query(self, text: str) -> List[float]:
+        with span("embed_query"):
+            if self.window <= 0 or self.max_batch <= 1:
+                return self.base.embed_query(text)
+            self._ensure_started()
+            future = Future()
+            self._queue.put((text, future))
+            return future.result()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                vectors = self.base.embed_documents([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+            self.stats["queries"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
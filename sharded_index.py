@@ -0,0 +1,247 @@
+"""
+Sharded vector store: one Chroma collection per document family.
+
+Layout under the store root (CHROMA_DB_PATH):
+
+    shards/<name>/            a complete Chroma store with its own ingest
+                              manifest and index_version (a shard without
+                              a manifest is retired and ignored)
+    shards/<name>/centroid.npy  mean unit embedding of the shard, for routing
+    index_version             bumped whenever any shard changes
+
+Ingestion (create_vector_db.py --shard-by folder|category) re-syncs each shard
+independently, so re-ingesting one family only touches its shard.
+ShardedRetriever queries the shards in parallel and merges their hits by
+distance. With SHARD_ROUTE_TOP > 0 each question only goes to the shards whose
+centroids are closest to it; this is approximate, a skipped shard cannot
+contribute a hit.
+"""
+import os
+import re
+import json
+import time
+import fnmatch
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from index_manifest import manifest_path, read_index_version
+from model_registry import get_vectorstore
+
+# --------------- CONFIGURATION --------------- #
+# How ingestion splits PDFs: "none" (one store), "folder" (first sub-folder of
+# the PDF folder) or "category" (patterns in SHARD_CATEGORIES_PATH)
+SHARD_BY = os.getenv("SHARD_BY", "none")
+SHARD_CATEGORIES_PATH = os.getenv("SHARD_CATEGORIES_PATH", "./shard_categories.json")
+SHARDS_DIRNAME = "shards"
+DEFAULT_SHARD = "default"
+CENTROID_NAME = "centroid.npy"
+# Shards searched per question, nearest centroids first (0 = every shard)
+SHARD_ROUTE_TOP = int(os.getenv("SHARD_ROUTE_TOP", 0))
+SHARD_QUERY_WORKERS = int(os.getenv("SHARD_QUERY_WORKERS", 8))
+# How often (seconds) a retriever checks whether a re-ingest added or removed shards
+SHARD_CHECK_INTERVAL = float(os.getenv("SHARD_CHECK_INTERVAL", 5.0))
+CENTROID_BATCH_SIZE = 5000
+
+
+# --------------- LAYOUT --------------- #
+def shard_directory(name: str, persist_directory: str) -> str:
+    return os.path.join(persist_directory, SHARDS_DIRNAME, name)
+
+
+def list_shards(persist_directory: str) -> List[str]:
+    """Names of the live shards under the store root (empty for an unsharded store)."""
+    root = os.path.join(persist_directory, SHARDS_DIRNAME)
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if os.path.exists(manifest_path(os.path.join(root, name))))
+
+
+def remove_shard(name: str, persist_directory: str):
+    """
+    Retire a shard whose vectors were already cleared. Its Chroma files stay:
+    a running server may still hold a handle to the collection, and deleting
+    them under it would break in-flight queries. Without a manifest the shard
+    is no longer listed, and ingesting into it again starts from empty.
+    """
+    shard_dir = shard_directory(name, persist_directory)
+    for path in (manifest_path(shard_dir), os.path.join(shard_dir, CENTROID_NAME)):
+        if os.path.exists(path):
+            os.remove(path)
+    print(f"[INFO] Removed shard '{name}' (no PDFs left in it).")
+
+
+def _shard_name(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", value).strip("._") or DEFAULT_SHARD
+
+
+def load_shard_categories(path: str = SHARD_CATEGORIES_PATH) -> Dict[str, str]:
+    """
+    {glob pattern: shard name}, matched in order against PDF paths relative to
+    the PDF folder, e.g. {"msme/*": "msme", "*agri*": "agriculture"}.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Shard categories file not found at {path}.")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def group_pdfs_by_shard(pdf_files: Sequence[str], pdf_root: str, shard_by: str = SHARD_BY) -> Dict[str, List[str]]:
+    """Split PDF paths into {shard name: paths}. Unmatched files go to the default shard."""
+    categories = load_shard_categories() if shard_by == "category" else {}
+    groups: Dict[str, List[str]] = {}
+    for path in pdf_files:
+        relative = os.path.relpath(path, pdf_root).replace(os.sep, "/")
+        if shard_by == "folder":
+            name = relative.split("/")[0] if "/" in relative else DEFAULT_SHARD
+        elif shard_by == "category":
+            name = next((shard for pattern, shard in categories.items() if fnmatch.fnmatch(relative, pattern)),
+                        DEFAULT_SHARD)
+        else:
+            raise ValueError(f"Unknown shard_by '{shard_by}'. Use 'folder' or 'category'.")
+        groups.setdefault(_shard_name(name), []).append(path)
+    return groups
+
+
+# --------------- ROUTING CENTROIDS --------------- #
+def write_shard_centroid(vectordb, shard_dir: str):
+    """Store the mean unit embedding of a shard's collection."""
+    collection = vectordb._collection
+    total, count = None, collection.count()
+    for offset in range(0, count, CENTROID_BATCH_SIZE):
+        batch = collection.get(include=["embeddings"], limit=CENTROID_BATCH_SIZE, offset=offset)
+        vectors = np.asarray(batch["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        summed = (vectors / np.where(norms == 0, 1, norms)).sum(axis=0)
+        total = summed if total is None else total + summed
+    path = os.path.join(shard_dir, CENTROID_NAME)
+    if total is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, total / count)
+    os.replace(tmp_path, path)
+
+
+def _load_centroids(names: List[str], persist_directory: str) -> Optional[np.ndarray]:
+    """Stacked unit centroids in `names` order, or None if any shard lacks one."""
+    rows = []
+    for name in names:
+        try:
+            rows.append(np.load(os.path.join(shard_directory(name, persist_directory), CENTROID_NAME)))
+        except FileNotFoundError:
+            return None
+    if not rows:
+        return None
+    centroids = np.stack(rows).astype(np.float32)
+    norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+    return centroids / np.where(norms == 0, 1, norms)
+
+
+# --------------- RETRIEVER --------------- #
+class ShardedRetriever(BaseRetriever):
+    """
+    LangChain retriever over every shard of a sharded store: each shard
+    returns its k nearest chunks, all in parallel, and the k closest overall
+    are kept. Similarity search only. Follows re-ingestion through the root
+    index version, picking up added and removed shards.
+    """
+
+    persist_directory: str
+    embedding_model: str
+    embeddings: Any
+    k: int = 3
+    route_top: int = SHARD_ROUTE_TOP
+    _names: List[str] = PrivateAttr(default_factory=list)
+    _stores: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _centroids: Any = PrivateAttr(default=None)
+    _version: Optional[str] = PrivateAttr(default=None)
+    _checked_at: float = PrivateAttr(default=0.0)
+    _reload_lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _pool: Any = PrivateAttr(default=None)
+    _pool_pid: Optional[int] = PrivateAttr(default=None)
+
+    @property
+    def shard_names(self) -> List[str]:
+        self.refresh()
+        return list(self._names)
+
+    def refresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < SHARD_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        if read_index_version(self.persist_directory) == self._version:
+            return
+        with self._reload_lock:
+            version = read_index_version(self.persist_directory)
+            if version == self._version:
+                return
+            names = list_shards(self.persist_directory)
+            self._stores = {
+                name: get_vectorstore(shard_directory(name, self.persist_directory), self.embedding_model)
+                for name in names
+            }
+            self._centroids = _load_centroids(names, self.persist_directory)
+            self._names = names
+            self._version = version
+            print(f"[INFO] Opened {len(names)} shard(s): {', '.join(names)}")
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Created on first use, and again in a forked child: threads do not survive fork()
+        if self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=SHARD_QUERY_WORKERS, thread_name_prefix="shard-query")
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def route(self, vectors: np.ndarray) -> Dict[str, List[int]]:
+        """{shard name: indices of the questions it should answer}."""
+        everything = list(range(len(vectors)))
+        if self.route_top <= 0 or self._centroids is None or len(self._names) <= self.route_top:
+            return {name: everything for name in self._names}
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        scores = (vectors / np.where(norms == 0, 1, norms)) @ self._centroids.T
+        nearest = np.argsort(-scores, axis=1)[:, :self.route_top]
+        routes: Dict[str, List[int]] = {}
+        for row, shard_indices in enumerate(nearest):
+            for s in shard_indices:
+                routes.setdefault(self._names[s], []).append(row)
+        return routes
+
+    def search_by_vectors(self, query_vectors: Sequence[List[float]]) -> List[List[Document]]:
+        """The merged top-k documents for each embedded question."""
+        self.refresh()
+        if not len(query_vectors):
+            return []
+        vectors = np.asarray(query_vectors, dtype=np.float32)
+
+        def query_shard(name: str, rows: List[int]):
+            result = self._stores[name]._collection.query(
+                query_embeddings=vectors[rows].tolist(), n_results=self.k,
+                include=["documents", "metadatas", "distances"],
+            )
+            return name, rows, result
+
+        hits = [[] for _ in range(len(vectors))]
+        for name, rows, result in self._executor().map(lambda item: query_shard(*item), self.route(vectors).items()):
+            for row, texts, metadatas, distances in zip(rows, result["documents"], result["metadatas"],
+                                                        result["distances"]):
+                hits[row].extend(zip(distances, [name] * len(texts), texts, metadatas))
+        return [
+            [Document(page_content=text, metadata={**(metadata or {}), "shard": name, "distance": distance})
+             for distance, name, text, metadata in sorted(row_hits, key=lambda hit: hit[0])[:self.k]]
+            for row_hits in hits
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: Optional[CallbackManagerForRetrieverRun] = None
+    ) -> List[Document]:
+        return self.search_by_vectors([self.embeddings.embed_query(query)])[0]
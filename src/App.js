@@ -2,10 +2,20 @@
 
 import React, { useState, useEffect, useRef } from "react";
 import SpeechRecognition, { useSpeechRecognition } from "react-speech-recognition";
-import { sendMessageToBackend } from "./api/chatApi";
+import { fetchHistory, streamMessageFromBackend } from "./api/chatApi";
 import { Send, Mic, User, Bot, CornerDownLeft, Settings } from 'lucide-react';
 import "./App.css";
 
+// A /history row in the shape the chat box renders
+const toChatMessage = (row) => ({
+  id: `history-${row.id}`,
+  sender: row.sender,
+  text: row.message,
+  timestamp: row.created_at
+    ? new Date(row.created_at).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
+    : '',
+});
+
 function App() {
   const [messages, setMessages] = useState([
     {
@@ -16,8 +26,28 @@ function App() {
   ]);
   const [input, setInput] = useState("");
   const [isTyping, setIsTyping] = useState(false);
+  const [historyCursor, setHistoryCursor] = useState(null);
   const chatEndRef = useRef(null);
 
+  // Insert restored messages right after the greeting, before anything newer
+  const prependHistory = (rows) => {
+    setMessages((prev) => [prev[0], ...rows.map(toChatMessage), ...prev.slice(1)]);
+  };
+
+  // Restore the latest page of this browser's conversation
+  useEffect(() => {
+    fetchHistory().then(({ messages: rows, nextCursor }) => {
+      prependHistory(rows);
+      setHistoryCursor(nextCursor);
+    });
+  }, []);
+
+  const loadEarlierMessages = async () => {
+    const { messages: rows, nextCursor } = await fetchHistory(historyCursor);
+    prependHistory(rows);
+    setHistoryCursor(nextCursor);
+  };
+
   useEffect(() => {
     chatEndRef.current?.scrollIntoView({ behavior: "smooth" });
   }, [messages, isTyping]);
@@ -51,8 +81,36 @@ function App() {
     setInput("");
     setIsTyping(true);
 
+    const botId = `bot-${Date.now()}`;
+    const botTimestamp = () => new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+    let botStarted = false;
+
+    // Create the bot message on the first streamed block, then patch it in place
+    const updateBotBlocks = (update) => {
+      if (!botStarted) {
+        botStarted = true;
+        setIsTyping(false);
+        setMessages((prev) => [...prev, { id: botId, sender: "bot", text: update([]), timestamp: botTimestamp() }]);
+        return;
+      }
+      setMessages((prev) => prev.map((m) => (m.id === botId ? { ...m, text: update(m.text) } : m)));
+    };
+
     try {
-      const data = await sendMessageToBackend(messageText);
+      const data = await streamMessageFromBackend(messageText, {
+        onBlock: (index, block) => updateBotBlocks((blocks) => {
+          const next = [...blocks];
+          next[index] = block;
+          return next;
+        }),
+        onItem: (blockIndex, title, item) => updateBotBlocks((blocks) => {
+          const next = [...blocks];
+          const section = next[blockIndex] || { type: 'section', title: title || '', items: [] };
+          next[blockIndex] = { ...section, title: section.title || title || '', items: [...section.items, item] };
+          return next;
+        }),
+      });
+
       let botResponseContent;
       
       // Handle both string and object responses from backend
@@ -62,9 +120,7 @@ function App() {
         botResponseContent = data.reply;
       }
 
-      const botTimestamp = new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
-      const botMessage = { sender: "bot", text: botResponseContent, timestamp: botTimestamp };
-      setMessages((prev) => [...prev, botMessage]);
+      updateBotBlocks(() => botResponseContent);
 
     } catch (err) {
       const errorTimestamp = new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
@@ -125,6 +181,11 @@ function App() {
       </div>
 
       <div className="chat-box">
+        {historyCursor && (
+          <button onClick={loadEarlierMessages} className="load-earlier-btn">
+            Load earlier messages
+          </button>
+        )}
         {messages.map((msg, index) => (
           <div key={index} className={`chat-message-wrapper ${msg.sender}`}>
             <div className={`chat-message`}>
@@ -1,5 +1,39 @@
 // src/api/chatApi.js
 
+const SESSION_KEY = "chatSessionId";
+
+// One id per browser, kept across reloads so /history can restore the conversation
+export function getSessionId() {
+  let sessionId = localStorage.getItem(SESSION_KEY);
+  if (!sessionId) {
+    sessionId = window.crypto?.randomUUID
+      ? window.crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+    localStorage.setItem(SESSION_KEY, sessionId);
+  }
+  return sessionId;
+}
+
+// One page of this session's history, oldest first.
+// Pass the previous page's nextCursor to get the messages before it.
+// Resolves to { messages, nextCursor } (empty on error).
+export async function fetchHistory(cursor = null, limit = 50) {
+  const params = new URLSearchParams({ session_id: getSessionId(), limit: String(limit) });
+  if (cursor) params.set("cursor", cursor);
+  try {
+    const response = await fetch(`http://127.0.0.1:5000/history?${params}`);
+    if (!response.ok) {
+      console.error("History request failed:", response.statusText);
+      return { messages: [], nextCursor: null };
+    }
+    const data = await response.json();
+    return { messages: data.messages || [], nextCursor: data.next_cursor };
+  } catch (err) {
+    console.error("Backend error:", err);
+    return { messages: [], nextCursor: null };
+  }
+}
+
 export async function sendMessageToBackend(message) {
   if (!message || !message.trim()) {
     return { reply: "Please type a valid message." };
@@ -13,7 +47,7 @@ export async function sendMessageToBackend(message) {
     const response = await fetch("http://127.0.0.1:5000/chat", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ message }),
+      body: JSON.stringify({ message, session_id: getSessionId() }),
       signal: controller.signal,
     });
 
@@ -40,3 +74,78 @@ export async function sendMessageToBackend(message) {
     return { reply: "Server error. Please try again." };
   }
 }
+
+// Streams a reply from /chat/stream (Server-Sent Events over a POST body).
+// handlers.onBlock(index, block)   -> a header/section/paragraph is complete
+// handlers.onItem(blockIndex, title, item) -> a scheme inside a still-open section
+// Resolves to { reply } once the backend sends its final "done" event.
+export async function streamMessageFromBackend(message, handlers = {}) {
+  if (!message || !message.trim()) {
+    return { reply: "Please type a valid message." };
+  }
+
+  // Abort only if the stream goes quiet, not because the answer is long
+  const controller = new AbortController();
+  let idleTimer = setTimeout(() => controller.abort(), 40000);
+  const resetIdleTimer = () => {
+    clearTimeout(idleTimer);
+    idleTimer = setTimeout(() => controller.abort(), 40000);
+  };
+
+  try {
+    const response = await fetch("http://127.0.0.1:5000/chat/stream", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ message, session_id: getSessionId() }),
+      signal: controller.signal,
+    });
+
+    if (!response.ok || !response.body) {
+      console.error("Backend returned error:", response.statusText);
+      return { reply: "Server error. Please try again." };
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let result = { reply: "No reply received from backend." };
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      resetIdleTimer();
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = "message";
+        let data = "";
+        for (const line of rawEvent.split("\n")) {
+          if (line.startsWith("event:")) event = line.slice(6).trim();
+          else if (line.startsWith("data:")) data += line.slice(5).trim();
+        }
+        if (!data) continue;
+        const payload = JSON.parse(data);
+
+        if (event === "token" && handlers.onToken) handlers.onToken(payload.text);
+        else if (event === "block" && handlers.onBlock) handlers.onBlock(payload.index, payload.block);
+        else if (event === "item" && handlers.onItem) handlers.onItem(payload.block, payload.title, payload.item);
+        else if (event === "done") result = { reply: payload.reply };
+        else if (event === "error") result = { reply: "Server error. Please try again." };
+      }
+    }
+    return result;
+  } catch (err) {
+    if (err.name === "AbortError") {
+      console.error("Stream timed out");
+      return { reply: "Server took too long to respond." };
+    }
+    console.error("Backend error:", err);
+    return { reply: "Server error. Please try again." };
+  } finally {
+    clearTimeout(idleTimer);
+  }
+}
@@ -0,0 +1,76 @@
+import answer_cache
+from answer_cache import VERSION_CHECK_INTERVAL, AnswerCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def make_cache(monkeypatch, **kwargs):
+    clock = FakeClock()
+    monkeypatch.setattr(answer_cache, "time", clock)
+    return AnswerCache(**kwargs), clock
+
+
+def test_exact_hit_until_ttl_expires(monkeypatch):
+    cache, clock = make_cache(monkeypatch, ttl_seconds=10)
+    cache.put("What are your hours?", "9 to 5")
+    clock.now += 5
+    assert cache.get("what are your hours")[0] == "9 to 5"
+    clock.now += 6
+    assert cache.get("what are your hours")[0] is None
+    assert cache.stats()["exact_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    cache, _ = make_cache(monkeypatch, max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    cache.get("a")  # "a" becomes the most recently used
+    cache.put("c", "C")
+    assert cache.get("a")[0] == "A"
+    assert cache.get("b")[0] is None
+    assert cache.get("c")[0] == "C"
+
+
+def test_index_version_change_drops_everything(monkeypatch):
+    version = ["v1"]
+    cache, clock = make_cache(monkeypatch, version_fn=lambda: version[0])
+    cache.put("a", "A")
+    version[0] = "v2"
+    assert cache.get("a")[0] == "A"  # the version is only re-read every VERSION_CHECK_INTERVAL
+    clock.now += VERSION_CHECK_INTERVAL + 0.1
+    assert cache.get("a")[0] is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_answer_computed_under_an_older_version_is_not_stored(monkeypatch):
+    version = ["v1"]
+    cache, _ = make_cache(monkeypatch, version_fn=lambda: version[0])
+    started_under = cache.current_version()
+    version[0] = "v2"  # re-ingested while the LLM was answering
+    cache.put("a", "A", version=started_under)
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["stale_puts"] == 1
+
+    cache.put("a", "A", version=cache.current_version())
+    assert cache.stats()["size"] == 1
+
+
+def test_semantic_hit_skips_rows_that_expired_after_the_matrix_was_built(monkeypatch):
+    cache, clock = make_cache(monkeypatch, ttl_seconds=10, similarity_threshold=0.9)
+    cache.put("old question", "old answer", vector=[1.0, 0.0])
+    clock.now += 5
+    cache.put("new question", "new answer", vector=[0.95, 0.31])
+    clock.now += 1
+    assert cache.get("paraphrase", vector=[1.0, 0.0])[0] == "old answer"
+
+    # "old question" is now past its TTL but still a row of the cached matrix
+    clock.now += 5
+    assert cache.get("paraphrase", vector=[1.0, 0.0])[0] == "new answer"
+    assert cache.stats()["semantic_hits"] == 2
@@ -0,0 +1,154 @@
+import sqlite3
+
+import pytest
+
+import chat_history
+from chat_history import fetch_history, resolve_session_id
+
+SESSION = "session-0001"
+
+
+class SQLiteConnection:
+    """Just enough of a MySQL connection for the read path, over SQLite."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+
+    def cursor(self):
+        return SQLiteCursor(self.conn.cursor())
+
+    def close(self):
+        self.conn.close()
+
+
+class SQLiteCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=()):
+        self.cursor.execute(sql.replace("%s", "?"), params)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
+
+@pytest.fixture
+def connect(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_history, "_schema_ready", True)
+    path = str(tmp_path / "history.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE chat_history (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, "
+                 "sender TEXT, message TEXT, created_at TEXT)")
+    for i in range(7):
+        conn.execute("INSERT INTO chat_history (session_id, sender, message, created_at) VALUES (?, ?, ?, ?)",
+                     (SESSION, "user", f"question {i}", f"2024-01-01T00:00:0{i}"))
+        conn.execute("INSERT INTO chat_history (session_id, sender, message, created_at) VALUES (?, ?, ?, ?)",
+                     ("other-session", "user", f"other {i}", "2024-01-01T00:00:00"))
+    conn.commit()
+    conn.close()
+    return lambda: SQLiteConnection(path)
+
+
+def test_pages_walk_back_through_the_session(connect):
+    seen, cursor = [], None
+    while True:
+        page = fetch_history(SESSION, cursor, limit=3, connection_factory=connect)
+        seen = [m["message"] for m in page["messages"]] + seen
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [f"question {i}" for i in range(7)]
+
+
+def test_first_page_is_the_newest_oldest_first(connect):
+    page = fetch_history(SESSION, limit=2, connection_factory=connect)
+    assert [m["message"] for m in page["messages"]] == ["question 5", "question 6"]
+    assert page["next_cursor"] == str(page["messages"][0]["id"])
+
+
+def test_exact_last_page_has_no_cursor(connect):
+    page = fetch_history(SESSION, limit=7, connection_factory=connect)
+    assert len(page["messages"]) == 7
+    assert page["next_cursor"] is None
+
+
+def test_bot_messages_are_decoded(connect):
+    conn = connect()
+    conn.conn.execute("INSERT INTO chat_history (session_id, sender, message, created_at) VALUES (?, ?, ?, ?)",
+                      (SESSION, "bot", '[{"type": "paragraph", "content": "hi"}]', "2024-01-01T00:01:00"))
+    conn.conn.commit()
+    conn.close()
+    page = fetch_history(SESSION, limit=1, connection_factory=connect)
+    assert page["messages"][0]["message"] == [{"type": "paragraph", "content": "hi"}]
+
+
+@pytest.mark.parametrize("session_id, cursor, limit", [
+    ("bad id!", None, 10),
+    (SESSION, "abc", 10),
+    (SESSION, None, 0),
+])
+def test_invalid_arguments(connect, session_id, cursor, limit):
+    with pytest.raises(ValueError):
+        fetch_history(session_id, cursor, limit, connection_factory=connect)
+
+
+class SchemaCursor:
+    """Answers the information_schema queries for a table that predates session_id."""
+
+    def __init__(self, executed):
+        self.executed = executed
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        self.executed.append(sql)
+        if "information_schema.COLUMNS" in sql:
+            self.rows = [("id",), ("sender",), ("message",), ("created_at",)]
+        elif "information_schema.STATISTICS" in sql:
+            self.rows = [("PRIMARY",), ("idx_chat_history_created_at",)]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class SchemaConnection:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def cursor(self):
+        return SchemaCursor(self.executed)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("migrate", [False, True])
+def test_ensure_schema_only_migrates_when_asked(monkeypatch, caplog, migrate):
+    monkeypatch.setattr(chat_history, "_schema_ready", False)
+    executed = []
+    assert chat_history.ensure_schema(lambda: SchemaConnection(executed), migrate=migrate)
+    alters = [sql for sql in executed if sql.startswith("ALTER")]
+    if migrate:
+        assert [sql.split()[5] for sql in alters] == ["session_id", "idx_chat_history_session"]
+    else:
+        assert alters == []
+        assert "column session_id, index idx_chat_history_session" in caplog.text
+    # Checked once per process
+    executed.clear()
+    assert chat_history.ensure_schema(lambda: SchemaConnection(executed))
+    assert executed == []
+
+
+def test_resolve_session_id():
+    assert len(resolve_session_id(None)) == 32
+    assert resolve_session_id(SESSION) == SESSION
+    with pytest.raises(ValueError):
+        resolve_session_id("short")
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from context_builder import approx_tokens, build_context, pack, remove_redundancy
+from metrics import CONTEXT_TOKENS_SAVED
+
+SENTENCE = "The scheme offers collateral free loans to micro and small enterprises across the country. "
+
+
+def test_contained_and_duplicate_chunks_are_dropped():
+    first = SENTENCE * 3
+    texts = [first, SENTENCE, first + " "]
+    assert remove_redundancy(texts) == [first.strip()]
+
+
+def test_near_duplicate_is_dropped_and_rank_order_kept():
+    other = "Eligibility requires a registered enterprise with a valid Udyam certificate and bank account."
+    first = " ".join(f"Clause {i} of the guideline sets out a distinct eligibility rule." for i in range(10))
+    near = first.replace("Clause 9", "Clause nine")
+    assert remove_redundancy([first, other, near]) == [first, other]
+
+
+def test_overlap_with_previous_chunk_is_cut():
+    text = "".join(f"Sentence number {i} describes one more detail of the scheme. " for i in range(20))
+    left, right = text[:700], text[500:]
+    kept = remove_redundancy([left, right])
+    assert kept[0] == left.strip()
+    assert kept[1] == text[700:].strip()
+
+
+def test_pack_respects_budget_and_truncates_last_chunk():
+    texts = [SENTENCE * 4, SENTENCE * 4]
+    budget = approx_tokens(texts[0]) + 50
+    packed = pack(texts, budget)
+    assert packed[0] == texts[0]
+    assert len(packed) == 2
+    assert approx_tokens(packed[1]) <= 50
+    assert packed[1].endswith(".")
+
+
+def test_pack_skips_small_remainder():
+    texts = [SENTENCE * 4, SENTENCE * 4]
+    assert pack(texts, approx_tokens(texts[0]) + 10) == [texts[0]]
+
+
+def test_build_context_reports_tokens_saved():
+    docs = [SimpleNamespace(page_content=SENTENCE * 3) for _ in range(3)]
+    saved_before = CONTEXT_TOKENS_SAVED._values.get((), 0)
+    context, stats = build_context(docs, budget=900)
+    assert context == (SENTENCE * 3).strip()
+    assert stats["chunks_in"] == 3 and stats["chunks_out"] == 1
+    assert stats["tokens_saved"] == stats["raw_tokens"] - stats["context_tokens"] > 0
+    assert CONTEXT_TOKENS_SAVED._values[()] - saved_before == stats["tokens_saved"]
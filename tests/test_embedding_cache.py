@@ -0,0 +1,55 @@
+import numpy as np
+
+from embedding_cache import CachedEmbeddings, EmbeddingCache, text_key
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def make_cache(tmp_path, max_entries=3):
+    return EmbeddingCache("test-model", str(tmp_path), max_entries=max_entries)
+
+
+def test_hits_skip_the_model_and_keep_order(tmp_path):
+    base = CountingEmbeddings()
+    embeddings = CachedEmbeddings(base, "test-model", make_cache(tmp_path))
+    first = embeddings.embed_documents(["a", "bb"])
+    second = embeddings.embed_documents(["bb", "ccc", "a"])
+    assert base.embedded == ["a", "bb", "ccc"]
+    assert second == [first[1], [3.0, 1.0, 0.0], first[0]]
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = make_cache(tmp_path, max_entries=3)
+    keys = [text_key("test-model", text) for text in ("a", "b", "c", "d")]
+    cache.put_many({key: [float(i), 0.0, 0.0] for i, key in enumerate(keys[:3])})
+    cache.get_many([keys[0]])  # "a" becomes the most recently used
+    cache.put_many({keys[3]: [3.0, 0.0, 0.0]})
+
+    assert len(cache) == 3
+    assert set(cache.get_many(keys)) == {keys[0], keys[2], keys[3]}
+    np.testing.assert_array_equal(cache.get_many([keys[3]])[keys[3]], [3.0, 0.0, 0.0])
+
+
+def test_evicted_rows_are_reused(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    for i in range(6):
+        cache.put_many({text_key("test-model", str(i)): [float(i), 0.0, 0.0]})
+    rows = [row for (row,) in cache._db.execute("SELECT row FROM entries")]
+    assert sorted(rows) == [0, 1]
+
+
+def test_entries_survive_reopening(tmp_path):
+    key = text_key("test-model", "a")
+    make_cache(tmp_path).put_many({key: [1.0, 2.0, 3.0]})
+    reopened = make_cache(tmp_path)
+    np.testing.assert_array_equal(reopened.get_many([key])[key], [1.0, 2.0, 3.0])
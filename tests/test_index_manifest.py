@@ -0,0 +1,36 @@
+from index_manifest import bump_index_version, diff_manifest, read_index_version
+
+PARAMS = {"chunk_size": 1000, "chunk_overlap": 200, "embedding_model": "m"}
+
+
+def manifest(files, params=PARAMS):
+    return {"params": params, "files": {path: {"sha256": sha} for path, sha in files.items()}}
+
+
+def test_unchanged_files_need_nothing():
+    assert diff_manifest(manifest({"a.pdf": "1"}), {"a.pdf": "1"}, PARAMS) == ([], [])
+
+
+def test_new_changed_and_deleted_files():
+    known = manifest({"a.pdf": "1", "b.pdf": "2", "c.pdf": "3"})
+    to_ingest, to_remove = diff_manifest(known, {"a.pdf": "1", "b.pdf": "20", "d.pdf": "4"}, PARAMS)
+    assert sorted(to_ingest) == ["b.pdf", "d.pdf"]
+    assert sorted(to_remove) == ["b.pdf", "c.pdf"]
+
+
+def test_changed_params_reingest_everything():
+    known = manifest({"a.pdf": "1", "b.pdf": "2"})
+    to_ingest, to_remove = diff_manifest(known, {"a.pdf": "1"}, {**PARAMS, "chunk_size": 500})
+    assert to_ingest == ["a.pdf"]
+    assert sorted(to_remove) == ["a.pdf", "b.pdf"]
+
+
+def test_empty_manifest_ingests_everything():
+    assert diff_manifest({}, {"a.pdf": "1"}, PARAMS) == (["a.pdf"], [])
+
+
+def test_index_version_changes_on_bump(tmp_path):
+    assert read_index_version(str(tmp_path)) == ""
+    first = bump_index_version(str(tmp_path))
+    assert read_index_version(str(tmp_path)) == first
+    assert bump_index_version(str(tmp_path)) != first
@@ -0,0 +1,50 @@
+import json
+
+from json_stream import IncrementalJSONParser, sse_event
+
+REPLY = [
+    {"type": "header", "content": "MSME schemes"},
+    {"type": "section", "title": "Credit & \"Financing\"", "items": [
+        {"scheme": "CGTMSE", "description": "Collateral-free {loans}"},
+        {"scheme": "PMEGP", "description": "Subsidy"},
+    ]},
+]
+
+
+def feed_in_chunks(text, size):
+    parser = IncrementalJSONParser()
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return parser, events
+
+
+def test_events_are_the_same_for_any_chunking():
+    text = json.dumps(REPLY)
+    expected = feed_in_chunks(text, len(text))[1]
+    for size in (1, 3, 17):
+        assert feed_in_chunks(text, size)[1] == expected
+
+
+def test_items_stream_before_their_section_closes():
+    parser, events = feed_in_chunks(json.dumps(REPLY), 1)
+    assert [kind for kind, _ in events] == ["block", "item", "item", "block"]
+    assert events[0][1] == {"index": 0, "block": REPLY[0]}
+    assert events[1][1] == {"block": 1, "title": 'Credit & "Financing"', "item": REPLY[1]["items"][0]}
+    assert events[3][1] == {"index": 1, "block": REPLY[1]}
+    assert parser.text == json.dumps(REPLY)
+
+
+def test_blocks_wrapped_in_an_object():
+    _, events = feed_in_chunks(json.dumps({"reply": REPLY[:1]}), 5)
+    assert events == [("block", {"index": 0, "block": REPLY[0]})]
+
+
+def test_braces_inside_strings_are_ignored():
+    text = json.dumps([{"type": "paragraph", "content": "a } b { c ]"}])
+    _, events = feed_in_chunks(text, 2)
+    assert [kind for kind, _ in events] == ["block"]
+
+
+def test_sse_event_format():
+    assert sse_event("token", {"text": "hi"}) == 'event: token\ndata: {"text": "hi"}\n\n'
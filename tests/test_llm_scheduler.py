@@ -0,0 +1,170 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from llm_scheduler import LLMBusyError, LLMScheduler, TokenBucket
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def test_bucket_admits_within_capacity_then_paces():
+    bucket = TokenBucket(per_minute=60)  # one token per second
+    assert bucket.reserve(60, max_wait=0) == 0.0
+    wait = bucket.reserve(1, max_wait=5)
+    assert 0.9 < wait <= 1.0
+
+
+def test_bucket_rejects_past_max_wait_without_reserving():
+    bucket = TokenBucket(per_minute=60)
+    bucket.reserve(60, max_wait=0)
+    level = bucket.level
+    assert bucket.reserve(10, max_wait=1) is None
+    assert bucket.level == pytest.approx(level, abs=0.1)
+
+
+def test_bucket_refund_is_capped_at_capacity():
+    bucket = TokenBucket(per_minute=60)
+    bucket.reserve(10, max_wait=0)
+    bucket.refund(100)
+    assert bucket.level == 60
+
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket(per_minute=0)
+    assert bucket.reserve(10 ** 9, max_wait=0) == 0.0
+
+
+def test_run_returns_result_and_counts_admission():
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0)
+    assert scheduler.run(lambda: "answer") == "answer"
+    assert scheduler.stats()["admitted"] == 1
+    assert scheduler.stats()["running"] == 0
+
+
+def test_run_rejects_when_budget_frees_after_deadline():
+    scheduler = LLMScheduler(requests_per_minute=1, tokens_per_minute=0, queue_timeout=0.5)
+    scheduler.run(lambda: "first")
+    with pytest.raises(LLMBusyError):
+        scheduler.run(lambda: "second")
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_run_rejects_when_no_slot_frees_before_deadline():
+    scheduler = LLMScheduler(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0, queue_timeout=0.1)
+    scheduler._slots.acquire()
+    try:
+        with pytest.raises(LLMBusyError):
+            scheduler.run(lambda: "late")
+    finally:
+        scheduler._slots.release()
+
+
+def test_run_rejects_when_queue_is_full():
+    scheduler = LLMScheduler(max_queue=0, requests_per_minute=0, tokens_per_minute=0)
+    with pytest.raises(LLMBusyError) as excinfo:
+        scheduler.run(lambda: "queued")
+    assert excinfo.value.retry_after >= 1
+
+
+def test_429_backs_off_and_retries_from_the_buckets():
+    scheduler = LLMScheduler(requests_per_minute=60, tokens_per_minute=600, queue_timeout=5)
+    attempts = []
+
+    def call():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RateLimited()
+        return "ok"
+
+    assert scheduler.run(call, tokens=100) == "ok"
+    assert len(attempts) == 2
+    assert scheduler.stats()["rate_limited"] == 1
+    # Both attempts drew a request; only the successful one holds tokens
+    assert scheduler.requests.level == pytest.approx(58, abs=0.5)
+    assert scheduler.tokens.level == pytest.approx(500, abs=5)
+
+
+def test_429_gives_up_after_max_retries():
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0, max_retries=1, queue_timeout=5)
+
+    def call():
+        raise RateLimited()
+
+    with pytest.raises(RateLimited):
+        scheduler.run(call)
+    assert scheduler.stats()["failed"] == 1
+
+
+def test_failed_call_refunds_its_reservation():
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=600)
+
+    def call():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduler.run(call, tokens=200)
+    assert scheduler.tokens.level == pytest.approx(600, abs=1)
+
+
+def test_settle_charges_actual_usage():
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=600)
+    scheduler.run(lambda: "answer", tokens=100)
+    scheduler.settle(100, 300)
+    assert scheduler.tokens.level == pytest.approx(300, abs=1)
+
+
+def test_arun_retries_after_429():
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0, queue_timeout=5)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RateLimited()
+        return "ok"
+
+    assert asyncio.run(scheduler.arun(call)) == "ok"
+    assert len(attempts) == 2
+
+
+def test_run_and_arun_share_one_concurrency_limit():
+    scheduler = LLMScheduler(max_concurrency=2, requests_per_minute=0, tokens_per_minute=0, queue_timeout=5)
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def enter():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+
+    def leave():
+        with lock:
+            active[0] -= 1
+
+    def call():
+        enter()
+        time.sleep(0.05)
+        leave()
+        return "sync"
+
+    async def acall():
+        enter()
+        await asyncio.sleep(0.05)
+        leave()
+        return "async"
+
+    async def async_callers():
+        return await asyncio.gather(*(scheduler.arun(acall) for _ in range(4)))
+
+    threads = [threading.Thread(target=scheduler.run, args=(call,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    assert asyncio.run(async_callers()) == ["async"] * 4
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    assert scheduler.stats()["admitted"] == 8
@@ -0,0 +1,35 @@
+import time
+
+from metrics import REQUEST_SECONDS, timed
+
+
+def request_count(endpoint):
+    series = REQUEST_SECONDS._series.get((endpoint,))
+    return series[2] if series else 0
+
+
+def test_streamed_body_is_timed_until_exhausted():
+    @timed("/test/stream")
+    def body():
+        yield "a"
+        time.sleep(0.02)
+        yield "b"
+
+    chunks = body()
+    assert next(chunks) == "a"
+    assert request_count("/test/stream") == 0
+    assert list(chunks) == ["b"]
+    assert request_count("/test/stream") == 1
+    assert REQUEST_SECONDS._series[("/test/stream",)][1] >= 0.02
+
+
+def test_streamed_body_closed_early_is_still_timed():
+    @timed("/test/disconnect")
+    def body():
+        yield "a"
+        yield "b"
+
+    chunks = body()
+    next(chunks)
+    chunks.close()  # the client went away mid-stream
+    assert request_count("/test/disconnect") == 1
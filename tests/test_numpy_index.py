@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pytest
+
+import numpy_index
+from numpy_index import CURRENT_NAME, NumpyVectorIndex, export_collection
+
+
+class FakeCollection:
+    def __init__(self, embeddings, documents=None, empty_pages=False):
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.documents = documents or [f"doc {i}" for i in range(len(self.embeddings))]
+        self.empty_pages = empty_pages
+
+    def count(self):
+        return len(self.embeddings)
+
+    def get(self, include, limit, offset):
+        end = 0 if self.empty_pages else offset + limit
+        rows = range(offset, min(end, len(self.embeddings)))
+        return {
+            "ids": [f"id-{i}" for i in rows],
+            "embeddings": [self.embeddings[i].tolist() for i in rows],
+            "documents": [self.documents[i] for i in rows],
+            "metadatas": [{"row": i} for i in rows],
+        }
+
+
+class FakeVectorDB:
+    def __init__(self, collection):
+        self._collection = collection
+
+
+def random_matrix(rows=50, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(rows, dim)).astype(np.float32)
+
+
+def brute_force_top_k(matrix, query, k):
+    unit = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    scores = unit @ (query / np.linalg.norm(query))
+    return list(np.argsort(-scores)[:k]), scores
+
+
+def export(tmp_path, matrix, dtype, version="v1", **kwargs):
+    export_collection(FakeVectorDB(FakeCollection(matrix, **kwargs)), str(tmp_path), dtype=dtype, index_version=version)
+    return NumpyVectorIndex(str(tmp_path))
+
+
+@pytest.fixture(autouse=True)
+def small_pages(monkeypatch):
+    # Several export pages and score blocks even for a 50-row matrix
+    monkeypatch.setattr(numpy_index, "EXPORT_PAGE_SIZE", 16)
+    monkeypatch.setattr(numpy_index, "SCORE_BLOCK_ROWS", 7)
+
+
+def test_float32_top_k_matches_brute_force_cosine(tmp_path):
+    matrix = random_matrix()
+    index = export(tmp_path, matrix, "float32")
+    queries = random_matrix(rows=5, seed=1)
+    for query, batch_hits in zip(queries, index.search_batch(queries, k=5)):
+        expected, scores = brute_force_top_k(matrix, query, 5)
+        hits = index.search(query, k=5)
+        assert [row for _, row in hits] == expected
+        np.testing.assert_allclose([score for score, _ in hits], scores[expected], rtol=1e-5)
+        assert [row for _, row in batch_hits] == expected
+        np.testing.assert_allclose([score for score, _ in batch_hits], scores[expected], rtol=1e-5)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_quantized_scores_stay_close_to_float32(tmp_path, dtype):
+    matrix = random_matrix()
+    index = export(tmp_path, matrix, dtype)
+    assert index.vectors.dtype == np.dtype(dtype)
+    assert (index.scales is not None) == (dtype == "int8")
+
+    unit = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    dequantized = index.vectors.astype(np.float32)
+    if index.scales is not None:
+        # Each row is scaled so its largest component maps to +-127
+        assert np.abs(index.vectors).max(axis=1).min() == 127
+        dequantized *= np.asarray(index.scales)[:, None]
+    np.testing.assert_allclose(dequantized, unit, atol=1 / 127)
+
+    query = random_matrix(rows=1, seed=2)[0]
+    expected, scores = brute_force_top_k(matrix, query, 5)
+    hits = index.search(query, k=5)
+    assert hits[0][1] == expected[0]
+    np.testing.assert_allclose([score for score, _ in hits], scores[[row for _, row in hits]], atol=0.02)
+
+
+def test_mmr_skips_near_duplicates(tmp_path):
+    matrix = [[1.0, 0.0, 0.0], [1.0, 0.02, 0.0], [0.6, 1.0, 0.0], [0.0, 0.0, 1.0]]
+    index = export(tmp_path, matrix, "float32")
+    query = [1.0, 0.3, 0.0]
+    assert [row for _, row in index.search(query, k=2)] == [1, 0]
+    assert [row for _, row in index.mmr_search(query, k=2, fetch_k=4)] == [1, 2]
+
+
+def test_records_are_read_back_by_byte_offset(tmp_path):
+    documents = ["plain", "naïve café ☕", "", "line\nbreak"]
+    index = export(tmp_path, random_matrix(rows=4), "float32", documents=documents)
+    for row in reversed(range(4)):
+        assert index.get_record(row) == {"id": f"id-{row}", "text": documents[row], "metadata": {"row": row}}
+
+
+def test_export_switches_current_and_removes_the_old_export(tmp_path):
+    old = export(tmp_path, random_matrix(), "float32", version="v1")
+    new = export(tmp_path, random_matrix(seed=3), "float32", version="v2")
+
+    assert new.index_version == "v2"
+    assert open(tmp_path / CURRENT_NAME).read() == "v-v2-float32"
+    assert sorted(os.listdir(tmp_path)) == [CURRENT_NAME, "v-v2-float32"]
+    assert old.get_record(0)["id"] == "id-0"  # an index opened before the swap keeps working
+
+
+def test_empty_first_page_keeps_the_previous_export(tmp_path):
+    export(tmp_path, random_matrix(), "float32", version="v1")
+    with pytest.raises(ValueError):
+        export(tmp_path, random_matrix(), "float32", version="v2", empty_pages=True)
+    assert NumpyVectorIndex(str(tmp_path)).index_version == "v1"
+    assert not os.path.exists(tmp_path / "v-v2-float32")